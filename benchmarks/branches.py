@@ -0,0 +1,42 @@
+# ------------------------------------------------
+# bwcc: benchmarks/branches.py
+#
+# 各优化级别下中间代码的跳转、标号条数和汇编中的跳转指令条数
+#
+# 用法：python -m benchmarks.branches [函数个数]
+# ------------------------------------------------
+import sys
+
+from c_assembler import CAssembler
+from c_jumps import count_branches
+from c_parser import CParser
+from c_passmgr import PassManager
+from c_translator import CTranslator
+from benchmarks.corpus import control_flow
+
+
+def measure(source, level):
+    translator = CTranslator()
+    translator.visit(CParser().parse(source))
+    codes = PassManager(level).run(translator.get_codes(), translator.symbol_table)
+    asm = CAssembler(translator.get_tables(codes)).asm(codes)
+    jumps = sum(1 for line in asm.splitlines() if line.startswith('\tj'))
+    labels = sum(1 for code in codes if code.op == 'label')
+    return len(codes), count_branches(codes), labels, jumps
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    source = control_flow(functions)
+    print('{:>4}{:>10}{:>10}{:>10}{:>12}'.format('', '四元式', '跳转', '标号', '跳转指令'))
+    baseline = None
+    for level in (0, 1, 2):
+        size, branches, labels, jumps = measure(source, level)
+        if baseline is None:
+            baseline = jumps
+        print('-O{}{:>10}{:>10}{:>10}{:>12}  ({:+.1%})'.format(
+            level, size, branches, labels, jumps, (jumps - baseline) / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# ------------------------------------------------
+# bwcc: benchmarks/corpus.py
+#
+# 生成基准测试用的C程序
+# ------------------------------------------------
+
+
+def straight_line(statements):
+    """ main 中有 statements 条 a = a + b * 3; 语句，每条翻译为 3 个四元式
+    """
+    body = '    a = a + b * 3;\n' * statements
+    return 'int main(){\n    int a = 0;\n    int b = 1;\n' + body + '    return a;\n}\n'
+
+
+def control_flow(functions):
+    """ functions 个函数，每个都含有 if/else、嵌套的 for 和 while 以及提前 return，
+    main 依次调用它们
+    """
+    parts = []
+    for n in range(functions):
+        parts.append('''int f{n}(int x){{
+    int s = 0;
+    for(int i = 0; i < x; i++){{
+        if (i > {n}) s = s + i;
+        else s = s - 1;
+        int j = i;
+        while (j > 0) {{
+            if (s > 1000) return s;
+            j = j - 2;
+        }}
+    }}
+    if (s < 0) {{
+        s = 0;
+    }}
+    return s;
+}}
+'''.format(n=n))
+    calls = ''.join('    t = t + f{}({});\n'.format(n, n % 7 + 3) for n in range(functions))
+    parts.append('int main(){\n    int t = 0;\n' + calls + '    return t;\n}\n')
+    return ''.join(parts)
+
+
+def calls(statements):
+    """ main 中有 statements 次 printf 调用，实参个数在 1 到 3 之间轮换，
+    另有几个 char 型局部变量
+    """
+    formats = ['    printf("%d\\n");\n', '    printf("%d\\n", a);\n', '    printf("%c%c\\n", c, d);\n']
+    body = ''.join(formats[n % 3] for n in range(statements))
+    return 'int main(){\n    int a = 1;\n    char c = \'x\';\n    char d = \'y\';\n' + body + '    return a;\n}\n'
+
+
+def expressions(statements):
+    """ f 中有 statements 条向右嵌套六层的表达式语句，形如 a * b + (c * d + (...))，
+    从左到右求值时左边的中间结果要一直保存到右边算完
+    """
+    body = ''.join('    r = r + (a * b + (c * d + (a * c + (b * d + (a * d + (b * c - {}))))));\n'.format(n)
+                   for n in range(statements))
+    return 'int f(int a, int b, int c, int d){\n    int r = 0;\n' + body + '    return r;\n}\n' \
+        'int main(){\n    return f(3, 4, 5, 6);\n}\n'
+
+
+def sums(statements):
+    """ f 中有 statements 条八项的和与积，夹杂几个常量 """
+    body = ''.join('    r = r + (a + b + 1 + c + d + e + 2 + g + h + {}) * (a * 2 * b * c * 3);\n'.format(n)
+                   for n in range(statements))
+    return 'int f(int a, int b, int c, int d, int e, int g, int h){\n    int r = 0;\n' + body + \
+        '    return r;\n}\nint main(){\n    return f(1, 2, 3, 4, 5, 6, 7);\n}\n'
+
+
+def loops(functions):
+    """ functions 个函数，每个都是一个循环，循环体中是下标计算那样的加法、
+    乘以常数和计数器的自增自减
+    """
+    parts = []
+    for n in range(functions):
+        parts.append('''int f{n}(int n, int base){{
+    int s = 0;
+    int i = 0;
+    int j = n;
+    while (i < n) {{
+        s = s + base + i * 4 + {n};
+        s = s - j * 8;
+        s = s + (i + 1) * 3;
+        j = j - 1;
+        i = i + 1;
+    }}
+    return s;
+}}
+'''.format(n=n))
+    calls = ''.join('    t = t + f{}({}, {});\n'.format(n, n % 5 + 2, n) for n in range(functions))
+    parts.append('int main(){\n    int t = 0;\n' + calls + '    return t;\n}\n')
+    return ''.join(parts)
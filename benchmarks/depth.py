@@ -0,0 +1,73 @@
+# ------------------------------------------------
+# bwcc: benchmarks/depth.py
+#
+# 重结合前后各基本块中四元式依赖链的长度（关键路径）之和、各条赋值语句的
+# 表达式深度之和，以及四元式条数
+#
+# 用法：python -m benchmarks.depth
+# ------------------------------------------------
+from c_cfg import build_cfgs
+from c_parser import CParser
+from c_passmgr import PassManager, PIPELINES
+from c_translator import CTranslator
+from benchmarks.corpus import expressions, sums
+
+
+def critical_path(codes):
+    """ 各块内按数据依赖计算的最长链之和，以及赋给局部变量的各个值的依赖链长度之和。
+
+    后者计算时局部变量看作叶子，即每条语句自身的表达式深度，不含 r = r + ...
+    这样跨语句累加的部分。copyprop 和 coalesce 之后局部变量大多已被消去，
+    它只对只做了 fold 的四元式有意义。
+    """
+    total = statements = 0
+    for cfg in build_cfgs(codes):
+        for block in cfg.blocks:
+            depth = {}  # {变量: 算出它的依赖链长度}
+            local = {}  # {变量: 从局部变量算起的依赖链长度}
+            longest = 0
+            for code in block.codes:
+                dest = code.dest()
+                if dest is None:
+                    continue
+                uses = code.uses()
+                d = max([depth.get(sym, 0) for sym in uses] + [0])
+                e = max([local.get(sym, 0) for sym in uses] + [0])
+                if code.op != '=':
+                    d += 1
+                    e += 1
+                depth[dest] = d
+                longest = max(longest, d)
+                if dest.kind == 'local':
+                    statements += e
+                    e = 0
+                local[dest] = e
+            total += longest
+    return total, statements
+
+
+def measure(source, pipeline):
+    translator = CTranslator()
+    translator.visit(CParser().parse(source))
+    codes = PassManager(pipeline).run(translator.get_codes(), translator.symbol_table)
+    return critical_path(codes) + (len(codes),)
+
+
+def main():
+    corpora = [('sums(100)', sums(100)), ('expressions(100)', expressions(100))]
+    print('{:<20}{:>6}{:>18}{:>18}'.format('', '', '不重结合', '重结合'))
+    for name, source in corpora:
+        before = measure(source, ['fold'])
+        after = measure(source, ['reassoc', 'fold'])
+        print('{:<20}{:>6}{:>14}{:>18}'.format(name, 'fold', before[1], after[1]))
+        for level in (1, 2):
+            pipeline = PIPELINES[level]
+            before = measure(source, [name for name in pipeline if name != 'reassoc'])
+            after = measure(source, pipeline)
+            print('{:<20}{:>6}{:>10}/{:<5}{:>12}/{:<5}'.format(
+                '', '-O{}'.format(level), before[0], before[2], after[0], after[2]))
+    print('（fold 一行为语句深度之和，-O1、-O2 为关键路径长度之和/四元式条数）')
+
+
+if __name__ == '__main__':
+    main()
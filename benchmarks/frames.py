@@ -0,0 +1,37 @@
+# ------------------------------------------------
+# bwcc: benchmarks/frames.py
+#
+# 各函数栈帧大小的总和，比较临时变量共用栈槽前后
+#
+# 用法：python -m benchmarks.frames
+# ------------------------------------------------
+from c_parser import CParser
+from c_passmgr import PassManager
+from c_translator import CTranslator
+from benchmarks.corpus import straight_line, control_flow, calls
+
+
+def frame_sizes(source, level, share_slots):
+    translator = CTranslator()
+    translator.visit(CParser().parse(source))
+    codes = PassManager(level).run(translator.get_codes(), translator.symbol_table)
+    tables = translator.get_tables(codes, share_slots=share_slots)
+    frames = tables['symbol_table'].values()
+    return sum(frame.stacksize for frame in frames), max(frame.stacksize for frame in frames)
+
+
+def main():
+    corpora = [('straight_line(1000)', straight_line(1000)),
+               ('control_flow(50)', control_flow(50)),
+               ('calls(1000)', calls(1000))]
+    print('{:<22}{:>5}{:>12}{:>12}{:>10}'.format('', '', '独占栈槽', '共用栈槽', '减少'))
+    for name, source in corpora:
+        for level in (0, 2):
+            before, before_max = frame_sizes(source, level, False)
+            after, after_max = frame_sizes(source, level, True)
+            saved = '{:.1%}'.format((before - after) / before) if before else '-'
+            print('{:<22}{:>5}{:>12}{:>12}{:>10}'.format(name, '-O{}'.format(level), before, after, saved))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# ------------------------------------------------
+# bwcc: benchmarks/ir_store.py
+#
+# 四元式存储的内存占用和遍历速度
+#
+# 用法：python -m benchmarks.ir_store [四元式条数]
+# ------------------------------------------------
+import sys
+import time
+import tracemalloc
+
+from c_assembler import CAssembler
+from c_ir import MCode
+from c_parser import CParser
+from c_translator import CTranslator
+from benchmarks.corpus import straight_line
+
+
+class DictMCode(object):
+    """ 改用 __slots__ 之前的四元式，作为对照 """
+
+    def __init__(self, op, arg1, arg2, result):
+        self.op = op
+        self.arg1 = arg1
+        self.arg2 = arg2
+        self.result = result
+
+
+def measure_memory(cls, codes):
+    tracemalloc.start()
+    copies = [cls(code.op, code.arg1, code.arg2, code.result) for code in codes]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return copies, size
+
+
+def measure_iteration(codes, rounds=10):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for code in codes:
+            code.op, code.arg1, code.arg2, code.result
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    quads = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    ast = CParser().parse(straight_line(quads // 3))
+    translator = CTranslator()
+    translator.visit(ast)
+    codes = translator.codes
+    print('四元式条数: {}'.format(len(codes)))
+
+    for cls in (DictMCode, MCode):
+        copies, size = measure_memory(cls, codes)
+        print('{:10} 内存 {:8.2f} MiB ({:.1f} 字节/条)  遍历 {:.2f} ms'.format(
+            cls.__name__, size / 2 ** 20, size / len(copies), measure_iteration(copies) * 1000))
+
+    start = time.perf_counter()
+    CAssembler(translator.get_tables()).asm(translator.get_codes())
+    print('CAssembler.asm {:.2f} s'.format(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
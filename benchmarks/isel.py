@@ -0,0 +1,53 @@
+# ------------------------------------------------
+# bwcc: benchmarks/isel.py
+#
+# 按模板翻译和用 c_isel 选择指令时汇编中的指令条数
+#
+# 用法：python -m benchmarks.isel
+# ------------------------------------------------
+from c_assembler import CAssembler
+from c_parser import CParser
+from c_passmgr import PassManager
+from c_translator import CTranslator
+from benchmarks.corpus import straight_line, expressions, loops
+
+
+def instructions(source, level, allocate, select):
+    """ 指令总数，以及其中循环体（标号到回跳的 jmp 之间）的条数 """
+    translator = CTranslator()
+    translator.visit(CParser().parse(source))
+    codes = PassManager(level).run(translator.get_codes(), translator.symbol_table)
+    tables = translator.get_tables(codes, omit_frame_pointer=level > 0)
+    assembler = CAssembler(tables, allocate=allocate, select=select)
+    assembler.asm(codes)
+    total = in_loops = 0
+    body = 0
+    for insn in assembler.insns:  # 直接数 (助记符, 操作数, ...) 记录，不依赖输出文本的格式
+        if insn[0] == 'label':
+            body = 0
+        elif not insn[0].startswith('.'):
+            total += 1
+            body += 1
+            if insn[0] == 'jmp' and insn[1].startswith('L'):
+                in_loops += body  # 翻译后的循环以标号开始，以回跳的 jmp 结束
+                body = 0
+    return total, in_loops
+
+
+def main():
+    corpora = [('straight_line(1000)', straight_line(1000)),
+               ('expressions(100)', expressions(100)),
+               ('loops(50)', loops(50))]
+    print('{:<22}{:>12}{:>16}{:>16}'.format('', '', '模板', '指令选择'))
+    for name, source in corpora:
+        for level, allocate in ((0, False), (2, True)):
+            before = instructions(source, level, allocate, False)
+            after = instructions(source, level, allocate, True)
+            print('{:<22}{:>12}{:>9}/{:<6}{:>9}/{:<6}'.format(
+                name, '-O{}{}'.format(level, ' 寄存器' if allocate else ''),
+                before[1], before[0], after[1], after[0]))
+    print('（循环中的指令条数/指令总数）')
+
+
+if __name__ == '__main__':
+    main()
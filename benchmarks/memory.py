@@ -0,0 +1,40 @@
+# ------------------------------------------------
+# bwcc: benchmarks/memory.py
+#
+# 寄存器分配前后汇编中访问栈帧的指令条数
+#
+# 用法：python -m benchmarks.memory
+# ------------------------------------------------
+from c_assembler import CAssembler
+from c_parser import CParser
+from c_passmgr import PassManager
+from c_translator import CTranslator
+from benchmarks.corpus import straight_line, control_flow, expressions
+
+
+def memory_operands(source, level, allocate):
+    translator = CTranslator()
+    translator.visit(CParser().parse(source))
+    codes = PassManager(level).run(translator.get_codes(), translator.symbol_table)
+    tables = translator.get_tables(codes, omit_frame_pointer=True)
+    asm = CAssembler(tables, allocate=allocate).asm(codes)
+    lines = [line for line in asm.splitlines() if line.startswith('\t') and not line.startswith('\t.')]
+    return len(lines), sum(1 for line in lines if '(%esp)' in line or '(%ebp)' in line)
+
+
+def main():
+    corpora = [('straight_line(1000)', straight_line(1000)),
+               ('control_flow(50)', control_flow(50)),
+               ('expressions(100)', expressions(100))]
+    print('{:<22}{:>5}{:>16}{:>16}'.format('', '', '栈帧中的变量', '寄存器分配'))
+    for name, source in corpora:
+        for level in (0, 2):
+            before = memory_operands(source, level, False)
+            after = memory_operands(source, level, True)
+            print('{:<22}{:>5}{:>9}/{:<6}{:>9}/{:<6}'.format(
+                name, '-O{}'.format(level), before[1], before[0], after[1], after[0]))
+    print('（访存指令条数/指令总数）')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# ------------------------------------------------
+# bwcc: benchmarks/peephole.py
+#
+# 窥孔优化前后汇编中的指令条数，以及各规则的改写次数
+#
+# 用法：python -m benchmarks.peephole
+# ------------------------------------------------
+from c_assembler import CAssembler
+from c_parser import CParser
+from c_passmgr import PassManager
+from c_translator import CTranslator
+from benchmarks.corpus import straight_line, control_flow, expressions, loops
+
+
+def instructions(source, level, peephole):
+    """ 指令条数（不含伪指令和标号）和各规则的改写次数；-O1 及以上同时做寄存器分配和指令选择 """
+    translator = CTranslator()
+    translator.visit(CParser().parse(source))
+    codes = PassManager(level).run(translator.get_codes(), translator.symbol_table)
+    tables = translator.get_tables(codes, omit_frame_pointer=level > 0)
+    assembler = CAssembler(tables, allocate=level > 0, select=level > 0, peephole=peephole)
+    asm = assembler.asm(codes)
+    lines = [line for line in asm.splitlines() if line.startswith('\t') and not line.startswith('\t.')]
+    return len(lines), assembler.rewrites
+
+
+def main():
+    corpora = [('straight_line(1000)', straight_line(1000)),
+               ('control_flow(50)', control_flow(50)),
+               ('expressions(100)', expressions(100)),
+               ('loops(50)', loops(50))]
+    print('{:<22}{:>5}{:>8}{:>8}  {}'.format('', '', '之前', '之后', '改写'))
+    for name, source in corpora:
+        for level in (0, 2):
+            before, _ = instructions(source, level, False)
+            after, rewrites = instructions(source, level, True)
+            print('{:<22}{:>5}{:>10}{:>10}  {}'.format(
+                name, '-O{}'.format(level), before, after,
+                ', '.join('{} {}'.format(rule, n) for rule, n in sorted(rewrites.items()))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# ------------------------------------------------
+# bwcc: bwcc-asm.py
+#
+# 只运行后端：读取 bwcc.py --emit-ir 保存的中间代码，用 CAssembler 生成汇编
+# ------------------------------------------------
+import argparse
+import sys
+import time
+
+from c_assembler import CAssembler
+from c_irfile import load_ir
+
+argparser = argparse.ArgumentParser(description='BWCC 后端：将中间代码文件汇编为 .s 文件')
+argparser.add_argument('ir', help='bwcc.py --emit-ir 保存的中间代码文件（文本或 .irb）')
+argparser.add_argument('-o', dest='output', default='hello.s', help='输出的汇编文件，缺省为 hello.s')
+argparser.add_argument('--regalloc', action='store_true', help='进行寄存器分配')
+argparser.add_argument('--isel', action='store_true', help='用 c_isel 为运算选择指令')
+argparser.add_argument('--peephole', action='store_true', help='对生成的指令做窥孔优化')
+argparser.add_argument('--time', action='store_true', help='在标准错误输出读取和汇编所用的时间')
+args = argparser.parse_args()
+
+start = time.perf_counter()
+codes, tables = load_ir(args.ir)
+loaded = time.perf_counter()
+asm = CAssembler(tables, allocate=args.regalloc, select=args.isel, peephole=args.peephole).asm(codes)
+done = time.perf_counter()
+
+with open(args.output, 'w') as f:
+    f.write(asm)
+if args.time:
+    sys.stderr.write('读取 {:.3f} s，汇编 {:.3f} s，共 {} 条四元式\n'.format(
+        loaded - start, done - loaded, len(codes)))
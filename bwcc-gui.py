@@ -6,6 +6,7 @@ from PyQt5.QtWidgets import QApplication, QWidget, QMainWindow, QGridLayout, QPu
 from c_parser import CParser
 from c_translator import CTranslator
 from c_assembler import CAssembler
+from c_index import ASTIndex
 import os
 
 class BWCC(QMainWindow):
@@ -13,6 +14,7 @@ class BWCC(QMainWindow):
     def __init__(self, *args, **kwargs):
         super(BWCC, self).__init__(*args, **kwargs)
         self.initUI()
+        self.index = None  # 最近一次编译的 AST 索引，供查找调用、跳转到定义等功能使用
         # self.parser = CParser()
         # self.translator = CTranslator
         # self.assembler = CAssembler
@@ -101,6 +103,7 @@ class BWCC(QMainWindow):
         parser = CParser()
         ast = parser.parse(self.textSrc.toPlainText())
         self.textAST.setText(ast.toString(attrnames=True, nodenames=True))
+        self.index = ASTIndex(ast)
         translator = CTranslator()
         translator.visit(ast)
         codes = translator.get_codes()
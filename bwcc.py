@@ -2,6 +2,10 @@ from c_parser import  CParser
 from c_translator import MCode
 from c_translator import CTranslator
 from c_assembler import CAssembler
+from c_fastgen import CFastGenerator
+from c_irfile import save_ir
+from c_passmgr import PassManager
+import argparse
 import os
 
 data = '''
@@ -15,23 +19,75 @@ int main(){
 }
         '''
 
+argparser = argparse.ArgumentParser(description='BWCC: 基于PLY的C语言子集编译器')
+argparser.add_argument('source', nargs='?', help='源程序文件，缺省时编译内置的示例程序')
+argparser.add_argument('--fast', action='store_true',
+                       help='快速编译模式：一次遍历 AST 直接生成汇编，不生成四元式')
+argparser.add_argument('-O', type=int, choices=(0, 1, 2), default=0, dest='opt_level',
+                       help='优化级别，缺省为 -O0 不优化')
+argparser.add_argument('--time-passes', action='store_true',
+                       help='输出每遍优化的耗时和四元式条数的变化')
+argparser.add_argument('--verify-ir', action='store_true',
+                       help='每遍优化之后校验中间代码')
+argparser.add_argument('--omit-frame-pointer', action='store_true', default=None,
+                       help='不使用 %%ebp 作为帧指针，空栈帧的函数不生成序言和尾声；-O1 及以上缺省开启')
+argparser.add_argument('--no-omit-frame-pointer', action='store_false', dest='omit_frame_pointer',
+                       help='总是保存 %%ebp 并建立帧指针')
+argparser.add_argument('--regalloc', action='store_true', default=None,
+                       help='线性扫描寄存器分配，变量尽量放在寄存器中；-O1 及以上缺省开启')
+argparser.add_argument('--no-regalloc', action='store_false', dest='regalloc',
+                       help='所有变量都放在栈帧中')
+argparser.add_argument('--isel', action='store_true', default=None,
+                       help='用 leal、incl 和内存操作数等指令模式覆盖表达式树；-O1 及以上缺省开启')
+argparser.add_argument('--no-isel', action='store_false', dest='isel',
+                       help='每条四元式按固定的模板翻译')
+argparser.add_argument('--peephole', action='store_true', default=None,
+                       help='对生成的指令做窥孔优化，删去多余的读写和跳转；-O1 及以上缺省开启')
+argparser.add_argument('--no-peephole', action='store_false', dest='peephole',
+                       help='不做窥孔优化')
+argparser.add_argument('--emit-ir', metavar='FILE',
+                       help='保存中间代码，以 .irb 结尾时为二进制格式，可用 bwcc-asm.py 汇编')
+args = argparser.parse_args()
+if args.omit_frame_pointer is None:
+    args.omit_frame_pointer = args.opt_level > 0
+if args.regalloc is None:
+    args.regalloc = args.opt_level > 0
+if args.isel is None:
+    args.isel = args.opt_level > 0
+if args.peephole is None:
+    args.peephole = args.opt_level > 0
+
+if args.source:
+    with open(args.source, 'r') as f:
+        data = f.read()
+
 parser = CParser()
 ast = parser.parse(data)
-# ast.show(attrnames=True, nodenames=True)
-print(ast.toString(attrnames=True, nodenames=True))
 
-translator = CTranslator()
-translator.visit(ast)
-for code in translator.get_codes():
-    print(code)
-tables = translator.get_tables()
-print(tables['symbol_table'])
-codes = translator.get_codes()
-assembler = CAssembler(tables)
-asm = assembler.asm(codes)
+if args.fast:
+    asm = CFastGenerator().generate(ast)
+else:
+    # ast.show(attrnames=True, nodenames=True)
+    print(ast.toString(attrnames=True, nodenames=True))
+
+    translator = CTranslator()
+    translator.visit(ast)
+    # 优化会增删栈帧中的变量，需要在 get_tables() 计算栈帧布局之前进行
+    passes = PassManager(args.opt_level, verify=args.verify_ir)
+    codes = passes.run(translator.get_codes(), translator.symbol_table)
+    if args.time_passes:
+        print(passes.report())
+    for code in codes:
+        print(code)
+    tables = translator.get_tables(codes, omit_frame_pointer=args.omit_frame_pointer)
+    print(tables['symbol_table'])
+    if args.emit_ir:
+        save_ir(args.emit_ir, codes, tables)
+    assembler = CAssembler(tables, allocate=args.regalloc, select=args.isel, peephole=args.peephole)
+    asm = assembler.asm(codes)
 print(asm)
 with open('hello.s', 'w') as f:
     f.write(asm)
 
 os.system('gcc {filename} -o hello.exe'.format(filename='hello.s'))
-os.system('hello.exe')
\ No newline at end of file
+os.system('hello.exe')
@@ -1,74 +1,231 @@
-from c_translator import WORD_SIZE
+from c_translator import WORD_SIZE, TYPE_WIDTH
+from c_cfg import build_cfgs
+from c_isel import select_instructions
+from c_peephole import Insn, optimize, render
+from c_regalloc import allocate_registers, clobbers, CALLEE_SAVED, DWARF_REGNO
 
 code_header = """
 	.file	"{filename}"
 	.def	___main;	.scl	2;	.type	32;	.endef
 """
 
-cond_dict = {'>': 'g', '<': 'l', '==': 'eq', '>=': 'ge', '<=': 'le', '!=': 'ne'}
+BYTE_REGS = {'%eax': '%al', '%ebx': '%bl', '%ecx': '%cl', '%edx': '%dl'}
+
+cond_dict = {'>': 'g', '<': 'l', '==': 'e', '>=': 'ge', '<=': 'le', '!=': 'ne'}
 
 
 class CAssembler(object):
-    def __init__(self, tables):
+    def __init__(self, tables, allocate=False, select=False, peephole=False):
         self.constant_table = tables['constant_table']
         self.symbol_table = tables['symbol_table']
-        self.asmtext = ''
+        self.allocate = allocate  # 是否进行寄存器分配
+        self.select = select  # 是否用 c_isel 为运算选择指令
+        self.peephole = peephole  # 是否对生成的指令做窥孔优化
+        self.rewrites = {}  # 窥孔优化各规则的改写次数
+        self.registers = {}  # {Symbol: 分配到的寄存器}
+        self.tiles = {}  # {id(四元式): 选出的指令}，见 select_instructions()
+        self.leaf = {}  # {函数名: 函数中没有调用}
+        self.saved = []  # 当前函数用到的被调用者保存寄存器
+        self.frame_size = 0  # 当前函数序言中 subl 的字节数
+        # (助记符, 操作数, ...) 的列表，最后才转换为文本。只含字符串的元组不被垃圾回收器
+        # 跟踪，几十万条也不会拖慢回收；窥孔优化时才转换为 Insn
+        self.insns = []
         self.lfe_count = -1
         self.lfb_count = 0
         self.cur_func = None
+        self.exit_label = None  # 函数出口的标号，return 跳转到这里
+        self.exit_used = False
 
     def _gen_func_header(self, funcname):
         if self.lfe_count > -1:
-            self.asmtext += 'LFE1{}:\n'.format(self.lfe_count)
+            self._insn('label', 'LFE1{}'.format(self.lfe_count))
         self.lfe_count = self.lfe_count + 1
 
         if funcname in [res[0] for res in self.constant_table.values()]:
-            self.asmtext += '\t.section .rdata,"dr"\n'
+            self._insn('.section', '.rdata,"dr"')
             for key in self.constant_table:
                 if self.constant_table[key][0] == funcname:
-                    self.asmtext += 'LC{}:\n'.format(self.constant_table[key][1])
-                    self.asmtext += '\t.ascii "{}\\0"\n'.format(key)
-            self.asmtext += '\t.text\n'
+                    self._insn('label', 'LC{}'.format(self.constant_table[key][1]))
+                    self._insn('.ascii', '"{}\\0"'.format(key))
+            self._insn('.text')
 
-        self.asmtext += '\t.globl\t_{}\n'.format(funcname)
-        self.asmtext += '\t.def\t_{}; .scl	2;	.type	32;	.endef\n'.format(funcname)
+        self._insn('.globl', '_{}'.format(funcname))
+        self._insn('.def', '_{}; .scl	2;	.type	32;	.endef'.format(funcname))
 
     def _gen_func_init(self, funcname):
-        self.asmtext += '_{}:\n'.format(funcname)
-        self.asmtext += 'LFB1{}:\n'.format(self.lfb_count)
+        self._insn('label', '_{}'.format(funcname))
+        self._insn('label', 'LFB1{}'.format(self.lfb_count))
+        self.exit_label = 'LE{}'.format(self.lfb_count)
+        self.exit_used = False
         self.lfb_count = self.lfb_count + 1
-        self.asmtext += '\t.cfi_startproc\n\tpushl	%ebp\n\t.cfi_def_cfa_offset 8\n\t.cfi_offset 5, -8\n\tmovl	%esp, %ebp\n\t.cfi_def_cfa_register 5\n'
-        if self.symbol_table[funcname]['stacksize'] > 0:
+        frame = self.symbol_table[funcname]
+        used = set(self.registers[sym] for sym in frame.symbols if sym in self.registers)
+        self.saved = [reg for reg in CALLEE_SAVED if reg in used]
+        # 保存寄存器的 pushl 打乱了 layout() 算好的对齐，有调用的函数需要补齐
+        self.frame_size = frame.stacksize
+        if not self.leaf.get(funcname, False) and funcname != 'main':
+            self.frame_size += -len(self.saved) * WORD_SIZE % 16
+        self._insn('.cfi_startproc')
+        if not frame.frame_pointer:
+            # 省略帧指针：CFA 始终为 %esp + 压栈和 subl 的字节数 + 4，空栈帧时不需要任何序言
+            cfa = WORD_SIZE
+            for reg in self.saved:
+                cfa += WORD_SIZE
+                self._insn('pushl', reg)
+                self._insn('.cfi_def_cfa_offset', str(cfa))
+                self._insn('.cfi_offset', str(DWARF_REGNO[reg]), '-{}'.format(cfa))
+            if self.frame_size > 0:
+                self._insn('subl', '${}'.format(self.frame_size), '%esp')
+                self._insn('.cfi_def_cfa_offset', str(cfa + self.frame_size))
+            return
+        self._insn('pushl', '%ebp')
+        self._insn('.cfi_def_cfa_offset', '8')
+        self._insn('.cfi_offset', '5', '-8')
+        self._insn('movl', '%esp', '%ebp')
+        self._insn('.cfi_def_cfa_register', '5')
+        for i, reg in enumerate(self.saved):
+            self._insn('pushl', reg)
+            self._insn('.cfi_offset', str(DWARF_REGNO[reg]), '-{}'.format((i + 3) * WORD_SIZE))
+        if self.frame_size > 0:
             if funcname == 'main':
-                self.asmtext += '\tandl	$-16, %esp\n'
-            self.asmtext += '\tsubl	${}, %esp\n'.format(self.symbol_table[funcname]['stacksize'])
+                self._insn('andl', '$-16', '%esp')
+            self._insn('subl', '${}'.format(self.frame_size), '%esp')
         if funcname == 'main':
-            self.asmtext += '\tcall\t___main\n'
+            self._insn('call', '___main')
 
     def _gen_func_exit(self, funcname):
-        if funcname == 'main':
-            self.asmtext += '\tleave\n'
+        # 函数最后一条 return 不需要跳转
+        last = self.insns[-1]
+        if last[0] == 'jmp' and last[1] == self.exit_label:
+            self.insns.pop()
+        if self.exit_used:
+            self._insn('label', self.exit_label)
+        frame = self.symbol_table[funcname]
+        if not frame.frame_pointer:
+            cfa = WORD_SIZE * (len(self.saved) + 1)
+            if self.frame_size > 0:
+                self._insn('addl', '${}'.format(self.frame_size), '%esp')
+                self._insn('.cfi_def_cfa_offset', str(cfa))
+            for reg in reversed(self.saved):
+                cfa -= WORD_SIZE
+                self._insn('popl', reg)
+                self._insn('.cfi_restore', str(DWARF_REGNO[reg]))
+                self._insn('.cfi_def_cfa_offset', str(cfa))
+            self._insn('ret')
+            self._insn('.cfi_endproc')
+            return
+        # main 对齐过 %esp，保存的寄存器按 %ebp 取回
+        for i, reg in enumerate(self.saved):
+            self._insn('movl', '-{}(%ebp)'.format((i + 1) * WORD_SIZE), reg)
+            self._insn('.cfi_restore', str(DWARF_REGNO[reg]))
+        if funcname == 'main' or self.frame_size > 0 or self.saved:
+            self._insn('leave')  # 分配过栈空间时需要先恢复 %esp
         else:
-            self.asmtext += '\tpopl\t%ebp\n'
-        self.asmtext += '\t.cfi_restore 5\n\t.cfi_def_cfa 4, 4\n\tret\n\t.cfi_endproc\n'
+            self._insn('popl', '%ebp')
+        self._insn('.cfi_restore', '5')
+        self._insn('.cfi_def_cfa', '4', '4')
+        self._insn('ret')
+        self._insn('.cfi_endproc')
 
     def _gen_code_footer(self):
         if self.lfe_count > -1:
-            self.asmtext += 'LFE1{}:\n'.format(self.lfe_count)
+            self._insn('label', 'LFE1{}'.format(self.lfe_count))
         self.lfe_count = self.lfe_count + 1
-        self.asmtext += '\t.ident\t"BWCC: (Nuke666.cn BWCC-0.0.1) 6.3.0"\n\t.def\t_printf;	.scl	2;	.type	32;	.endef\n'
+        self._insn('.ident', '"BWCC: (Nuke666.cn BWCC-0.0.1) 6.3.0"')
+        self._insn('.def', '_printf;	.scl	2;	.type	32;	.endef')
 
     def _get_var(self, sym):
-        if sym.isdigit() or (sym[0] == '-' and sym[1:].isdigit()) or sym.startswith('LC'):
-            return '$' + sym
-        elif sym.startswith('_'):
+        kind = sym.kind
+        if sym in self.registers:
+            return self.registers[sym]
+        if kind == 'local' or kind == 'temp':
+            return '{offset}(%esp)'.format(offset=sym.offset or '')
+        elif kind == 'imm':
+            return '${}'.format(sym.value)
+        elif kind == 'str':
+            return '$LC{}'.format(sym.index)
+        elif kind == 'param':
+            frame = self.symbol_table[self.cur_func]
+            if not frame.frame_pointer:
+                # 形参的 offset 相对于 %ebp，省略帧指针时没有保存的 %ebp
+                pushed = len(self.saved) * WORD_SIZE
+                return '{}(%esp)'.format(sym.offset - WORD_SIZE + pushed + self.frame_size)
+            return '{}(%ebp)'.format(sym.offset)
+        else:  # 函数返回值
             return '%eax'
-        else: return '{offset}(%esp)'.format(offset=self.symbol_table[self.cur_func]['symbols'][sym] or '')
+
+    def _is_byte(self, sym):
+        # char 型的局部变量和临时变量只占一个字节，形参由调用者按字传递
+        return (sym.kind == 'local' or sym.kind == 'temp') and TYPE_WIDTH[sym.type] == 1
+
+    def _in_memory(self, sym):
+        return sym.kind in ('local', 'temp', 'param') and sym not in self.registers
+
+    def _load(self, sym, reg='%eax'):
+        # 将操作数读入寄存器，函数返回值本来就在 %eax 中
+        var = self._get_var(sym)
+        if self._is_byte(sym):
+            self._insn('movsbl', var, reg)
+        elif var != reg:
+            self._insn('movl', var, reg)
+
+    def _store(self, value, sym):
+        # 把寄存器或立即数写入变量，char 型变量只写低字节
+        var = self._get_var(sym)
+        if self._is_byte(sym):
+            if value.startswith('%') and value not in BYTE_REGS:  # %esi、%edi 没有字节寄存器
+                self._insn('movl', value, '%eax')
+                value = '%eax'
+            self._insn('movb', BYTE_REGS.get(value, value), var)
+        elif value != var:
+            self._insn('movl', value, var)
+
+    def _move(self, value, sym):
+        # sym = value，内存之间的复制经过 %eax
+        if sym in self.registers:
+            self._load(value, self.registers[sym])
+        elif self._in_memory(value) or self._is_byte(value):
+            self._load(value)
+            self._store('%eax', sym)
+        else:
+            self._store(self._get_var(value), sym)
+
+    def _get_rhs(self, sym):
+        # 第二个操作数，读入第一个操作数前先把 %eax 中的函数返回值移走
+        if sym.kind == 'call':
+            self._insn('movl', '%eax', '%ecx')
+            return '%ecx'
+        if self._is_byte(sym):
+            self._insn('movsbl', self._get_var(sym), '%ecx')
+            return '%ecx'
+        return self._get_var(sym)
+
+    def _allocate(self, codes):
+        # 逐个函数做寄存器分配和指令选择，同时记下哪些是叶函数
+        for cfg in build_cfgs(codes):
+            self.leaf[cfg.name] = not any(code.op == 'call' for code in cfg.codes())
+            if self.allocate:
+                self.registers.update(allocate_registers(cfg))
+            if self.select:
+                self.tiles.update(select_instructions(cfg, self.registers))
+
+    def _insn(self, op, *args):
+        self.insns.append((op,) + args)
+
+    def _emit(self, insn):
+        # insn 为 (助记符, 操作数, ...)，Symbol 和 Imm 在这里才转换，形参的偏移量要等序言确定
+        self._insn(insn[0], *[operand if isinstance(operand, str) else self._get_var(operand) for operand in insn[1:]])
 
     def asm(self, codes):
+        codes = list(codes)
+        self._allocate(codes)
         symbols = None
         for code in codes:
-            if code.op == 'func':
+            if id(code) in self.tiles:
+                # 并入其他四元式的没有指令
+                for insn in self.tiles[id(code)]:
+                    self._emit(insn)
+            elif code.op == 'func':
                 self.cur_func = code.result
                 self._gen_func_header(code.result)
                 self._gen_func_init(code.result)
@@ -81,39 +238,65 @@ class CAssembler(object):
                 arg = code.arg2
                 offset = (code.result - 1 - code.arg1) * WORD_SIZE # 计算参数应放入堆栈中的偏移量
                 if offset == 0: offset = ''
-                if arg.isdigit() or arg.startswith('LC'):
-                    self.asmtext += '\tmovl\t${}, {}(%esp)\n'.format(arg, offset)
+                if arg.kind == 'imm' or arg.kind == 'str' or arg in self.registers:
+                    self._insn('movl', self._get_var(arg), '{}(%esp)'.format(offset))
                 else:
-                    self.asmtext += '\tmovl\t{}, %eax\n'.format(self._get_var(arg))
-                    self.asmtext += '\tmovl\t%eax, {}(%esp)\n'.format(offset)
+                    self._load(arg)
+                    self._insn('movl', '%eax', '{}(%esp)'.format(offset))
             elif code.op == 'call':
-                self.asmtext += '\tcall\t_{}\n'.format(code.result)
+                self._insn('call', '_{}'.format(code.result))
             elif code.op == 'return':
-                self.asmtext += '\tmovl\t{}, %eax\n'.format(self._get_var(code.result) or 0)
+                if code.result is not None:
+                    self._load(code.result)
+                self._insn('jmp', self.exit_label)
+                self.exit_used = True
             elif code.op == 'label':
-                self.asmtext += '{}:\n'.format(code.result)
+                self._insn('label', 'L{}'.format(code.result))
             elif code.op == 'j':
-                self.asmtext += '\tjmp {}\n'.format(code.result)
+                self._insn('jmp', 'L{}'.format(code.result))
             elif code.op.startswith('j'):
-                self.asmtext += '\tmovl\t{}, %eax\n'.format(self._get_var(code.arg1))
-                self.asmtext += '\tcmpl\t{}, %eax\n'.format(self._get_var(code.arg2))
-                self.asmtext += '\tj{} {}\n'.format(cond_dict[code.op[1:]], code.result)
+                rhs = self._get_rhs(code.arg2)
+                lhs = self.registers.get(code.arg1, '%eax')
+                self._load(code.arg1, lhs)
+                self._insn('cmpl', rhs, lhs)
+                self._insn('j' + cond_dict[code.op[1:]], 'L{}'.format(code.result))
             elif code.op == '=':
-                if code.arg1.isdigit():
-                    self.asmtext += '\tmovl\t${arg}, {var}\n'.format(arg=code.arg1, var=self._get_var(code.result))
-                else:
-                    self.asmtext += '\tmovl\t{}, %eax\n'.format(self._get_var(code.arg1))
-                    self.asmtext += '\tmovl\t%eax, {}\n'.format(self._get_var(code.result))
+                self._move(code.arg1, code.result)
             elif code.op in ('+', '-', '*'):
                 keymap = {'+':'addl', '-': 'subl', '*': 'imull'}
-                self.asmtext += '\tmovl\t{}, %eax\n'.format(self._get_var(code.arg1))
-                self.asmtext += '\t{}\t{}, %eax\n'.format(keymap[code.op], self._get_var(code.arg2))
-                self.asmtext += '\tmovl\t%eax, {}\n'.format(self._get_var(code.result))
-            elif code.op in ('/'):
-                self.asmtext += '\tmovl\t{}, %eax\n'.format(self._get_var(code.arg1))
-                self.asmtext += '\tcltd\n'
-                self.asmtext += '\tidivl\t, {}\n'.format(self._get_var(code.arg2))
+                arg1, arg2 = code.arg1, code.arg2
+                dest = self.registers.get(code.result)
+                if dest is not None and code.op != '-' and self._get_var(arg2) == dest and \
+                        arg1.kind != 'call' and not self._is_byte(arg1):
+                    # 交换后 arg1 成为第二个操作数；它要借用 %ecx 时不交换，clobbers() 是按
+                    # 原来的顺序算的，%ecx 可能正是 dest，还存着 arg2
+                    arg1, arg2 = arg2, arg1
+                if dest is not None and dest not in clobbers(code) and self._get_var(arg2) != dest:
+                    # 结果在寄存器中，直接在目标寄存器上运算
+                    rhs = self._get_rhs(arg2)
+                    self._load(arg1, dest)
+                    self._insn(keymap[code.op], rhs, dest)
+                else:
+                    rhs = self._get_rhs(arg2)
+                    self._load(arg1)
+                    self._insn(keymap[code.op], rhs, '%eax')
+                    self._store('%eax', code.result)
+            elif code.op in ('/', '%'):
+                # idivl 不接受立即数作为除数
+                rhs = self._get_rhs(code.arg2)
+                if code.arg2.kind == 'imm':
+                    self._insn('movl', rhs, '%ecx')
+                    rhs = '%ecx'
+                self._load(code.arg1)
+                self._insn('cltd')
+                self._insn('idivl', rhs)
+                self._store('%eax' if code.op == '/' else '%edx', code.result)
 
         self._gen_code_footer()
 
-        return code_header.format(filename='hello.c') + self.asmtext
+        if self.peephole:
+            insns, self.rewrites = optimize(Insn(*insn) for insn in self.insns)
+            lines = [str(insn) for insn in insns]
+        else:
+            lines = [render(insn[0], insn[1:]) for insn in self.insns]
+        return code_header.format(filename='hello.c') + ''.join(line + '\n' for line in lines)
@@ -0,0 +1,329 @@
+# ------------------------------------------------
+# bwcc: c_cfg.py
+#
+# CFG class: 将函数的四元式划分为基本块，建立控制流图，计算支配关系和自然循环
+# ------------------------------------------------
+from c_ir import MCode
+
+
+def is_jump(code):
+    """ j 和 j<cond> """
+    return code.op[0] == 'j'
+
+
+def is_terminator(code):
+    """ 之后的四元式不会顺序执行到：无条件跳转和 return """
+    return code.op == 'j' or code.op == 'return'
+
+
+class BasicBlock(object):
+    """ 基本块
+
+    Attributes:
+        index: 在 CFG.blocks 中的序号
+        codes: 块内的四元式，label 只可能是第一条，跳转和 return 只可能是最后一条
+        succs: 后继块，有条件跳转时依次为跳转目标和顺序执行的下一块
+        preds: 前驱块
+        idom: 直接支配者，入口块和不可达块为 None
+        loop_depth: 所在自然循环的嵌套层数
+    """
+    __slots__ = ('index', 'codes', 'succs', 'preds', 'idom', 'loop_depth')
+
+    def __init__(self, index, codes):
+        self.index = index
+        self.codes = codes
+        self.succs = []
+        self.preds = []
+        self.idom = None
+        self.loop_depth = 0
+
+    @property
+    def label(self):
+        """ 块开头的标号，没有则为 None """
+        if self.codes and self.codes[0].op == 'label':
+            return self.codes[0].result
+        return None
+
+    def __repr__(self):
+        return 'B{}'.format(self.index)
+
+
+class Loop(object):
+    """ 自然循环，同一个循环头的所有回边合并为一个循环
+
+    Attributes:
+        header: 循环头
+        blocks: 循环体内的基本块（含循环头）
+        latches: 回边的起点
+    """
+    __slots__ = ('header', 'blocks', 'latches')
+
+    def __init__(self, header):
+        self.header = header
+        self.blocks = {header}
+        self.latches = []
+
+
+class CFG(object):
+    """ 一个函数的控制流图
+
+    划分基本块、连接边都只需扫描一遍四元式。支配关系使用 Cooper-Harvey-Kennedy
+    迭代算法，按逆后序处理，可归约的控制流图通常两三轮即可收敛。
+
+    Attributes:
+        name: 函数名
+        blocks: 按原四元式顺序排列的基本块，blocks[0] 为入口
+    """
+
+    def __init__(self, name, codes):
+        self.name = name
+        self.blocks = []
+        self._dominators = False
+        self._build(codes)
+
+    @property
+    def entry(self):
+        return self.blocks[0]
+
+    def codes(self):
+        """ 按块的顺序把四元式拼接起来，不含 func 和 endfunc """
+        return [code for block in self.blocks for code in block.codes]
+
+    def _build(self, codes):
+        current = []
+        for code in codes:
+            if code.op == 'label' and current:
+                self._add_block(current)
+                current = []
+            current.append(code)
+            if is_jump(code) or code.op == 'return':
+                self._add_block(current)
+                current = []
+        if current or not self.blocks:
+            self._add_block(current)
+        self.link()
+
+    def symbols(self):
+        """ 四元式中读写的所有变量 """
+        used = set()
+        for block in self.blocks:
+            for code in block.codes:
+                used.update(code.uses())
+                dest = code.dest()
+                if dest is not None:
+                    used.add(dest)
+        return used
+
+    def rebuild(self):
+        """ 删改了标号或跳转之后重新划分基本块，顺序相连的块会合并 """
+        codes = self.codes()
+        self.blocks = []
+        self._build(codes)
+
+    def _add_block(self, codes):
+        self.blocks.append(BasicBlock(len(self.blocks), codes))
+
+    def link(self):
+        """ 根据各块最后一条四元式重新建立前驱、后继关系。
+
+        修改了块的划分或跳转之后调用，之前计算的支配关系随之失效。
+        phi 中来自已删除的边的操作数一并删去。
+        """
+        labels = {}
+        for i, block in enumerate(self.blocks):
+            block.index = i
+            block.succs = []
+            block.preds = []
+            if block.label is not None:
+                labels[block.label] = block
+        for i, block in enumerate(self.blocks):
+            last = block.codes[-1] if block.codes else None
+            if last is not None and is_jump(last):
+                block.succs.append(labels[last.result])
+            if (last is None or not is_terminator(last)) and i + 1 < len(self.blocks):
+                block.succs.append(self.blocks[i + 1])
+            for succ in block.succs:
+                succ.preds.append(block)
+        # SSA 形式中删去 phi 里已经不存在的边
+        for block in self.blocks:
+            for code in block.codes:
+                if code.op == 'phi':
+                    for pred in [pred for pred in code.arg1 if pred not in block.preds]:
+                        del code.arg1[pred]
+                elif code.op != 'label':
+                    break
+        self._dominators = False
+
+    def reverse_postorder(self):
+        """ 从入口可达的基本块的逆后序 """
+        order = []
+        visited = {self.entry}
+        stack = [(self.entry, iter(self.entry.succs))]
+        while stack:
+            block, succs = stack[-1]
+            for succ in succs:
+                if succ not in visited:
+                    visited.add(succ)
+                    stack.append((succ, iter(succ.succs)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    def compute_dominators(self):
+        """ 计算每个基本块的 idom 和 loop_depth """
+        if self._dominators:
+            return
+        order = self.reverse_postorder()
+        rpo = {block: i for i, block in enumerate(order)}
+        for block in self.blocks:
+            block.idom = None
+        entry = self.entry
+        entry.idom = entry
+
+        changed = True
+        while changed:
+            changed = False
+            for block in order[1:]:
+                new_idom = None
+                for pred in block.preds:
+                    if pred.idom is None:
+                        continue
+                    if new_idom is None:
+                        new_idom = pred
+                        continue
+                    # 沿支配树向上找两者的最近公共祖先
+                    a, b = pred, new_idom
+                    while a is not b:
+                        while rpo[a] > rpo[b]:
+                            a = a.idom
+                        while rpo[b] > rpo[a]:
+                            b = b.idom
+                    new_idom = a
+                if block.idom is not new_idom:
+                    block.idom = new_idom
+                    changed = True
+        entry.idom = None
+        self._rpo = order
+        self._rpo_index = rpo
+
+        # 给支配树做先序、后序编号，dominates() 只需比较区间
+        children = self._dom_children = {block: [] for block in order}
+        for block in order[1:]:
+            children[block.idom].append(block)
+        self._dom_pre = {}
+        self._dom_post = {}
+        counter = 0
+        stack = [(entry, iter(children[entry]))]
+        self._dom_pre[entry] = counter
+        while stack:
+            block, it = stack[-1]
+            child = next(it, None)
+            if child is None:
+                stack.pop()
+                self._dom_post[block] = counter
+            else:
+                counter += 1
+                self._dom_pre[child] = counter
+                stack.append((child, iter(children[child])))
+        self._dominators = True
+
+        for block in self.blocks:
+            block.loop_depth = 0
+        for loop in self.natural_loops():
+            for block in loop.blocks:
+                block.loop_depth += 1
+
+    def dominates(self, a, b):
+        """ a 是否支配 b，不可达的块只被自己支配 """
+        self.compute_dominators()
+        if a is b:
+            return True
+        if a not in self._dom_pre or b not in self._dom_pre:
+            return False
+        return self._dom_pre[a] <= self._dom_pre[b] <= self._dom_post[a]
+
+    def dominator_tree(self):
+        """ 返回 {基本块: 支配树中的子结点}，只含可达的块 """
+        self.compute_dominators()
+        return self._dom_children
+
+    def dominator_preorder(self):
+        """ 支配树的先序，父结点总在子结点之前 """
+        self.compute_dominators()
+        return sorted(self._dom_pre, key=self._dom_pre.get)
+
+    def dominance_frontiers(self):
+        """ 返回 {基本块: 支配边界集合}，只含可达的块。
+
+        使用 Cooper-Harvey-Kennedy 的算法：对每个有多个前驱的块，从各前驱沿
+        支配树向上走到它的直接支配者为止，途经的块的支配边界都包含它。
+        """
+        self.compute_dominators()
+        frontiers = {block: set() for block in self._rpo}
+        for block in self._rpo:
+            preds = [pred for pred in block.preds if pred in self._rpo_index]
+            if len(preds) < 2:
+                continue
+            for pred in preds:
+                runner = pred
+                while runner is not block.idom and runner is not None:
+                    frontiers[runner].add(block)
+                    runner = runner.idom
+        return frontiers
+
+    def natural_loops(self):
+        """ 返回所有自然循环，外层循环在前 """
+        self.compute_dominators()
+        loops = {}
+        for block in self._rpo:
+            for succ in block.succs:
+                if self.dominates(succ, block):
+                    loop = loops.get(succ)
+                    if loop is None:
+                        loop = loops[succ] = Loop(succ)
+                    loop.latches.append(block)
+                    # 从回边起点逆着前驱边找到循环体
+                    stack = [block]
+                    while stack:
+                        b = stack.pop()
+                        if b not in loop.blocks and b in self._rpo_index:
+                            loop.blocks.add(b)
+                            stack.extend(b.preds)
+        return sorted(loops.values(), key=lambda loop: len(loop.blocks), reverse=True)
+
+
+def split_functions(codes):
+    """ 将整个程序的四元式按函数切分
+
+    Returns:
+        [(函数名, 函数体四元式)]，函数体不含 func 和 endfunc
+    """
+    functions = []
+    body = None
+    for code in codes:
+        if code.op == 'func':
+            body = []
+            functions.append((code.result, body))
+        elif code.op == 'endfunc':
+            body = None
+        else:
+            body.append(code)
+    return functions
+
+
+def build_cfgs(codes):
+    """ 为每个函数建立控制流图 """
+    return [CFG(name, body) for name, body in split_functions(codes)]
+
+
+def join_functions(cfgs):
+    """ build_cfgs() 的逆过程，重新拼接成整个程序的四元式 """
+    codes = []
+    for cfg in cfgs:
+        codes.append(MCode('func', None, None, cfg.name))
+        codes.extend(cfg.codes())
+        codes.append(MCode('endfunc', None, None, None))
+    return codes
@@ -0,0 +1,171 @@
+# ------------------------------------------------
+# bwcc: c_copyprop.py
+#
+# 拷贝传播和拷贝合并：消除 visit_Assignment、visit_UnaryOp 等产生的 x = T 拷贝
+# ------------------------------------------------
+from c_dataflow import Liveness, solve, iter_bits
+from c_ir import TYPE_WIDTH
+
+COPY_SOURCES = ('local', 'temp', 'param', 'imm')
+
+
+def _is_copy(code):
+    # 函数返回值只在下一次调用之前有效，不传播；截断为 char 的赋值之后两者不再相等
+    return code.op == '=' and code.arg1.kind in COPY_SOURCES and code.arg1 is not code.result and \
+        not code.narrows()
+
+
+def propagate_copies(cfg, frame):
+    """ 全局拷贝传播。
+
+    以可用拷贝分析（前向 must 问题）求出每一点上成立的 x = y，把 x 的使用
+    替换为 y。拷贝 x = y 在 x 或 y 被重新赋值时失效。替换后原来的拷贝多半
+    变为死代码，留给死代码删除。
+
+    Returns:
+        替换的操作数个数
+    """
+    copies = []  # 第 i 位对应的拷贝的 (目标, 源)
+    bit_of = {}  # {四元式: 位}
+    related = {}  # {变量: 以它为目标或源的拷贝的位向量}
+    targets = {}  # {变量: 以它为目标的拷贝的位向量}
+    for block in cfg.blocks:
+        for code in block.codes:
+            if code.op != 'phi' and _is_copy(code):
+                bit = 1 << len(copies)
+                copies.append((code.result, code.arg1))
+                bit_of[code] = bit
+                related[code.result] = related.get(code.result, 0) | bit
+                targets[code.result] = targets.get(code.result, 0) | bit
+                if code.arg1.kind != 'imm':
+                    related[code.arg1] = related.get(code.arg1, 0) | bit
+    if not copies:
+        return 0
+
+    def transfer(avail, code):
+        dest = code.dest()
+        if dest is not None:
+            avail &= ~related.get(dest, 0)
+            avail |= bit_of.get(code, 0)
+        return avail
+
+    gen = []
+    kill = []
+    for block in cfg.blocks:
+        g = k = 0
+        for code in block.codes:
+            dest = code.dest()
+            if dest is not None:
+                k |= related.get(dest, 0)
+            g = transfer(g, code)
+        gen.append(g)
+        kill.append(k)
+    universe = (1 << len(copies)) - 1
+    ins, _ = solve(cfg, gen, kill, forward=True, may=False, universe=universe)
+
+    changed = 0
+    for block in cfg.reverse_postorder():
+        avail = ins[block.index]
+        for code in block.codes:
+            if code.op != 'phi':
+                for field in code.use_fields():
+                    value = getattr(code, field)
+                    match = avail & targets.get(value, 0) if value is not None else 0
+                    if match:
+                        source = copies[(match & -match).bit_length() - 1][1]
+                        setattr(code, field, source)
+                        changed += 1
+            avail = transfer(avail, code)
+    return changed
+
+
+def coalesce_copies(cfg, frame):
+    """ 拷贝合并。
+
+    对拷贝 x = y，若 x 和 y 的生存期不相交（不冲突），就把 y 全部改名为 x
+    并删去拷贝，T = x + 1; x = T 由此变为 x = x + 1，只需一次读写。
+    冲突关系由活跃变量分析得到：在 v 的定值点之后活跃的变量都与 v 冲突，
+    拷贝的源除外。只合并同类型的局部变量和临时变量，合并时保留局部变量。
+
+    Returns:
+        删去的拷贝条数
+    """
+    liveness = Liveness(cfg)
+    candidates = 0
+    pairs = []
+    for block in cfg.blocks:
+        for code in block.codes:
+            if code.op == '=' and _coalescable(code.arg1, code.result):
+                pairs.append((code.result, code.arg1))
+                candidates |= liveness.bit(code.result) | liveness.bit(code.arg1)
+    if not pairs:
+        return 0
+
+    # 只记录候选变量之间的冲突
+    edges = {}
+    for block in cfg.blocks:
+        for code, live in liveness.walk_backward(block):
+            dest = code.dest()
+            if dest is None:
+                continue
+            bit = liveness.bit(dest)
+            if not bit & candidates:
+                continue
+            others = live & candidates & ~bit
+            if code.op == '=' and code.arg1 is not None and code.arg1.kind in ('local', 'temp'):
+                others &= ~liveness.bit(code.arg1)
+            if others:
+                edges[bit] = edges.get(bit, 0) | others
+                for i in iter_bits(others):
+                    edges[1 << i] = edges.get(1 << i, 0) | bit
+
+    rename = {}  # {被合并的变量: 代表变量}
+    classes = {}  # {代表变量: (所含变量的位向量, 与之冲突的变量的位向量)}
+
+    def find(sym):
+        while sym in rename:
+            sym = rename[sym]
+        return sym
+
+    def get_class(sym):
+        if sym not in classes:
+            bit = liveness.bit(sym)
+            classes[sym] = (bit, edges.get(bit, 0))
+        return classes[sym]
+
+    for x, y in pairs:
+        x, y = find(x), find(y)
+        if x is y:
+            continue
+        x_mask, x_edges = get_class(x)
+        y_mask, y_edges = get_class(y)
+        if x_edges & y_mask or y_edges & x_mask:
+            continue
+        if x.kind == 'temp' and y.kind == 'local':
+            x, y = y, x
+        rename[y] = x
+        classes[x] = (x_mask | y_mask, x_edges | y_edges)
+
+    if not rename:
+        return 0
+    removed = 0
+    for block in cfg.blocks:
+        codes = []
+        for code in block.codes:
+            for field in code.use_fields():
+                value = getattr(code, field)
+                if value in rename:
+                    setattr(code, field, find(value))
+            if code.dest() in rename:
+                code.result = find(code.result)
+            if code.op == '=' and code.arg1 is code.result:
+                removed += 1
+                continue
+            codes.append(code)
+        block.codes = codes
+    return removed
+
+
+def _coalescable(source, dest):
+    return source is not dest and source.kind in ('local', 'temp') and \
+        dest.kind in ('local', 'temp') and TYPE_WIDTH[source.type] == TYPE_WIDTH[dest.type]
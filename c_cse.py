@@ -0,0 +1,91 @@
+# ------------------------------------------------
+# bwcc: c_cse.py
+#
+# 局部值编号：在基本块内删去公共子表达式
+# ------------------------------------------------
+from c_ir import MCode
+
+EXPRESSION_OPS = ('+', '-', '*', '/', '%', '>', '<', '==', '>=', '<=', '!=')
+COMMUTATIVE = ('+', '*', '==', '!=')
+
+
+def local_cse(cfg, frame):
+    """ 对每个基本块做局部值编号。
+
+    每个变量当前的值对应一个值编号，表达式以 (op, 左值编号, 右值编号) 为键，
+    记录计算结果的值编号和保存它的变量。再次遇到相同的键，且保存结果的变量
+    还没有被重新赋值时，把这条四元式改为从该变量拷贝。+、*、==、!= 的两个
+    操作数按值编号排序，a*b 和 b*a 视为同一个表达式。
+
+    变量被重新赋值后得到新的值编号，含有旧值的表达式的键自然不再匹配；
+    函数返回值在每次 call 之后得到新的值编号。截断为 char 的赋值也得到新的
+    值编号，不与源相同。
+
+    Returns:
+        改为拷贝的四元式条数
+    """
+    changed = 0
+    for block in cfg.blocks:
+        numbers = {}  # {变量或常量的键: 值编号}
+        table = {}  # {表达式的键: (值编号, 保存结果的变量)}
+        counter = [0]
+
+        def fresh():
+            counter[0] += 1
+            return counter[0]
+
+        def number(operand):
+            key = _operand_key(operand)
+            if key not in numbers:
+                numbers[key] = fresh()
+            return numbers[key]
+
+        codes = []
+        for code in block.codes:
+            op = code.op
+            if op == 'call':
+                numbers[('call', code.result)] = fresh()
+            dest = code.dest()
+            if dest is None or op == 'phi':
+                if dest is not None:
+                    numbers[dest] = fresh()
+                codes.append(code)
+                continue
+            if op == '=':
+                numbers[dest] = fresh() if code.narrows() else number(code.arg1)
+                codes.append(code)
+                continue
+            if op not in EXPRESSION_OPS:
+                numbers[dest] = fresh()
+                codes.append(code)
+                continue
+
+            left, right = number(code.arg1), number(code.arg2)
+            if op in COMMUTATIVE and right < left:
+                left, right = right, left
+            key = (op, left, right)
+            entry = table.get(key)
+            if entry is not None and numbers.get(entry[1]) == entry[0]:
+                value, holder = entry
+                numbers[dest] = value
+                changed += 1
+                if holder is not dest:
+                    codes.append(MCode('=', holder, None, dest))
+                continue
+            value = numbers[dest] = fresh()
+            table[key] = (value, dest)
+            codes.append(code)
+        block.codes = codes
+    return changed
+
+
+def _operand_key(operand):
+    """ 立即数、字符串常量按值，函数返回值按函数名，变量按对象本身 """
+    kind = operand.kind
+    if kind == 'imm':
+        return ('imm', operand.value)
+    if kind == 'str':
+        return ('str', operand.index)
+    if kind == 'call':
+        return ('call', operand.func)
+    return operand
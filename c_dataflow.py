@@ -0,0 +1,190 @@
+# ------------------------------------------------
+# bwcc: c_dataflow.py
+#
+# 位向量数据流分析：通用的工作表求解器，以及活跃变量和到达定值分析
+# ------------------------------------------------
+from collections import deque
+
+
+def solve(cfg, gen, kill, forward=True, may=True, boundary=0, universe=0):
+    """ 用工作表算法求解位向量数据流方程。
+
+    集合用 Python 的整数表示，第 i 位为 1 表示第 i 个元素在集合中，求交、
+    求并、求差都是整数的位运算，元素多达数万个时也只是若干个机器字的运算。
+
+    传递函数为 out = gen | (in & ~kill)，后向问题中 in、out 互换。
+
+    Args:
+        cfg: CFG
+        gen, kill: 以 block.index 为下标的列表
+        forward: 前向问题为 True，后向问题为 False
+        may: 交汇运算为并（may 问题）时为 True，为交（must 问题）时为 False
+        boundary: 入口块的 in（后向问题为出口块的 out）
+        universe: 全集，must 问题中作为除边界以外各块的初值
+
+    Returns:
+        (ins, outs)，以 block.index 为下标。后向问题中 ins 为块入口处的值。
+    """
+    blocks = cfg.blocks
+    n = len(blocks)
+    init = 0 if may else universe
+    ins = [init] * n
+    outs = [init] * n
+
+    order = cfg.reverse_postorder()
+    if not forward:
+        order.reverse()
+    # 不可达的块也要参与计算，放在最后
+    reached = set(order)
+    order.extend(block for block in blocks if block not in reached)
+
+    if forward:
+        sources = [[pred.index for pred in block.preds] for block in blocks]
+        targets = [[succ.index for succ in block.succs] for block in blocks]
+        first = ins  # 由交汇运算得到的一侧
+        second = outs  # 由传递函数得到的一侧
+    else:
+        sources = [[succ.index for succ in block.succs] for block in blocks]
+        targets = [[pred.index for pred in block.preds] for block in blocks]
+        first = outs
+        second = ins
+
+    worklist = deque(block.index for block in order)
+    queued = [True] * n
+    while worklist:
+        i = worklist.popleft()
+        queued[i] = False
+
+        if not sources[i]:
+            value = boundary
+        elif may:
+            value = 0
+            for j in sources[i]:
+                value |= second[j]
+        else:
+            value = universe
+            for j in sources[i]:
+                value &= second[j]
+        first[i] = value
+
+        new = gen[i] | (value & ~kill[i])
+        if new != second[i]:
+            second[i] = new
+            for j in targets[i]:
+                if not queued[j]:
+                    queued[j] = True
+                    worklist.append(j)
+    return ins, outs
+
+
+def iter_bits(bits):
+    """ 依次给出集合中各元素的下标 """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class Liveness(object):
+    """ 活跃变量分析，后向的 may 问题。
+
+    Attributes:
+        variables: 第 i 位对应的 Symbol
+        index: {Symbol: 位序号}
+        live_in, live_out: 以 block.index 为下标的位向量
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.variables = []
+        self.index = {}
+        uses = []
+        defs = []
+        for block in cfg.blocks:
+            use = define = 0
+            for code in block.codes:
+                for sym in code.uses():
+                    bit = 1 << self._number(sym)
+                    if not define & bit:
+                        use |= bit
+                dest = code.dest()
+                if dest is not None:
+                    define |= 1 << self._number(dest)
+            uses.append(use)
+            defs.append(define)
+        self.live_in, self.live_out = solve(cfg, uses, defs, forward=False)
+
+    def _number(self, sym):
+        i = self.index.get(sym)
+        if i is None:
+            i = self.index[sym] = len(self.variables)
+            self.variables.append(sym)
+        return i
+
+    def bit(self, sym):
+        """ sym 对应的位，从未出现过的变量为 0 """
+        i = self.index.get(sym)
+        return 0 if i is None else 1 << i
+
+    def walk_backward(self, block):
+        """ 从块尾向块首依次给出 (四元式, 该四元式之后活跃的变量) """
+        live = self.live_out[block.index]
+        for code in reversed(block.codes):
+            yield code, live
+            dest = code.dest()
+            if dest is not None:
+                live &= ~self.bit(dest)
+            for sym in code.uses():
+                live |= self.bit(sym)
+
+    def symbols(self, bits):
+        return [self.variables[i] for i in iter_bits(bits)]
+
+
+class ReachingDefinitions(object):
+    """ 到达定值分析，前向的 may 问题。
+
+    Attributes:
+        definitions: 第 i 位对应的 (基本块, 四元式)
+        defs_of: {Symbol: 该变量所有定值的位向量}
+        bit_of: {四元式: 该定值对应的位}
+        reach_in, reach_out: 以 block.index 为下标的位向量
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.definitions = []
+        self.defs_of = {}
+        self.bit_of = {}
+        block_defs = []
+        for block in cfg.blocks:
+            last = {}  # 块内每个变量最后一次定值
+            for code in block.codes:
+                dest = code.dest()
+                if dest is not None:
+                    bit = 1 << len(self.definitions)
+                    self.definitions.append((block, code))
+                    self.defs_of[dest] = self.defs_of.get(dest, 0) | bit
+                    self.bit_of[code] = bit
+                    last[dest] = bit
+            block_defs.append(last)
+
+        gen = []
+        kill = []
+        for last in block_defs:
+            g = k = 0
+            for sym, bit in last.items():
+                g |= bit
+                k |= self.defs_of[sym]
+            gen.append(g)
+            kill.append(k & ~g)
+        self.reach_in, self.reach_out = solve(cfg, gen, kill, forward=True)
+
+    def walk_forward(self, block):
+        """ 从块首向块尾依次给出 (四元式, 到达该四元式之前的定值) """
+        reach = self.reach_in[block.index]
+        for code in block.codes:
+            yield code, reach
+            dest = code.dest()
+            if dest is not None:
+                reach = (reach & ~self.defs_of[dest]) | self.bit_of[code]
@@ -0,0 +1,57 @@
+# ------------------------------------------------
+# bwcc: c_dce.py
+#
+# 死代码删除：删去结果不再使用的四元式和从入口不可达的基本块
+# ------------------------------------------------
+from c_dataflow import Liveness
+
+# 除了写入结果之外没有其它作用的操作。除以 0 是未定义行为，/ 和 % 也可以删去
+PURE_OPS = ('=', '+', '-', '*', '/', '%', '>', '<', '==', '>=', '<=', '!=', 'phi')
+
+
+def remove_unreachable(cfg):
+    """ 删去从入口不可达的块，返回删去的四元式条数。
+
+    不可达的块不会是可达块顺序执行的下一块，删去后不影响其余块的控制流。
+    """
+    reachable = set(cfg.reverse_postorder())
+    if len(reachable) == len(cfg.blocks):
+        return 0
+    removed = sum(len(block.codes) for block in cfg.blocks if block not in reachable)
+    cfg.blocks = [block for block in cfg.blocks if block in reachable]
+    cfg.link()
+    return removed
+
+
+def eliminate_dead_code(cfg, frame):
+    """ 先删去不可达的块，再根据活跃变量分析删去结果不活跃的无副作用四元式。
+
+    删去一条四元式可能使它的操作数也不再活跃，因此重复分析直到没有变化。
+    函数返回前栈帧即被释放，对形参的赋值在函数外也不可见，同样按活跃性处理。
+
+    Returns:
+        删去的四元式条数
+    """
+    removed = remove_unreachable(cfg)
+    while True:
+        liveness = Liveness(cfg)
+        count = 0
+        for block in cfg.blocks:
+            live = liveness.live_out[block.index]
+            codes = []
+            for code in reversed(block.codes):
+                dest = code.dest()
+                if dest is not None:
+                    bit = liveness.bit(dest)
+                    if code.op in PURE_OPS and not live & bit:
+                        count += 1
+                        continue
+                    live &= ~bit
+                for sym in code.uses():
+                    live |= liveness.bit(sym)
+                codes.append(code)
+            codes.reverse()
+            block.codes = codes
+        if not count:
+            return removed
+        removed += count
@@ -0,0 +1,404 @@
+# ------------------------------------------------
+# bwcc: c_fastgen.py
+#
+# CFastGenerator class: 快速编译模式，一次遍历 AST 直接生成汇编代码
+# ------------------------------------------------
+import c_ast
+from c_assembler import code_header, cond_dict
+from c_translator import WORD_SIZE
+from utils import constant_value
+
+arith_dict = {'+': 'addl', '-': 'subl', '*': 'imull', '&': 'andl', '|': 'orl', '^': 'xorl'}
+
+
+class CFastGenerator(object):
+    """ 快速编译模式的代码生成器。
+
+    不生成四元式，也不经过 get_tables() 和 CAssembler，而是在一次 AST 遍历中
+    直接输出汇编代码，适合修改-编译-运行的循环中对编译速度比代码质量更敏感的
+    场合。
+
+    与 CTranslator + CAssembler 的区别：
+        - 局部变量和形参都以 %ebp 为基址寻址，声明时即可确定偏移量，
+          因此只需在函数体生成完毕后补上函数头部
+        - 表达式的值总是留在 %eax 中，只有二元运算的右操作数较复杂时才借用
+          一个临时栈位，临时栈位按表达式嵌套深度复用
+        - char 局部变量也占一个字，写入前截断为 8 位再作符号扩展，读出的值
+          与 CAssembler 用 movb、movsbl 存取时相同
+    """
+
+    def __init__(self, filename='hello.c'):
+        self.filename = filename
+        self.asmtext = ''
+        self.func_count = 0
+        self.label_count = 0
+        self.string_count = 0
+
+    def generate(self, ast):
+        """ 为 FileAST 生成完整的汇编代码。
+        """
+        self.visit(ast)
+        if self.func_count > 0:
+            self.asmtext += 'LFE1{}:\n'.format(self.func_count - 1)
+        self.asmtext += '\t.ident\t"BWCC: (Nuke666.cn BWCC-0.0.1) 6.3.0"\n\t.def\t_printf;	.scl	2;	.type	32;	.endef\n'
+        return code_header.format(filename=self.filename) + self.asmtext
+
+    #################### PRIVATE ####################
+
+    def _newlabel(self):
+        self.label_count = self.label_count + 1
+        return 'L' + str(self.label_count)
+
+    def _out(self, text):
+        self.body.append(text)
+
+    def _emitlabel(self, label):
+        self.body.append('{}:\n'.format(label))
+
+    def _alloc(self):
+        # 在栈帧中分配一个字，返回以 %ebp 为基址的操作数
+        self.frame_size += WORD_SIZE
+        return '-{}(%ebp)'.format(self.frame_size)
+
+    def _push_temp(self):
+        if self.temp_depth == len(self.temp_slots):
+            self.temp_slots.append(self._alloc())
+        slot = self.temp_slots[self.temp_depth]
+        self.temp_depth += 1
+        return slot
+
+    def _pop_temp(self):
+        self.temp_depth -= 1
+
+    def _lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        raise NameError('未定义的标识符 {}'.format(name))
+
+    def _string(self, value):
+        s = value[1:-1]
+        if s not in self.strings:
+            self.strings[s] = self.string_count
+            self.string_count += 1
+        return '$LC{}'.format(self.strings[s])
+
+    def _operand(self, node):
+        """ 若 node 可以直接作为指令的操作数则返回其汇编形式，否则返回 None。
+        """
+        if isinstance(node, c_ast.Constant):
+            if node.type == 'string':
+                return self._string(node.value)
+            return '${}'.format(constant_value(node))
+        elif isinstance(node, c_ast.ID):
+            return self._lookup(node.name)
+        return None
+
+    def _apply(self, op, operand):
+        """ 生成 %eax = %eax op operand
+        """
+        if op in arith_dict:
+            self._out('\t{}\t{}, %eax\n'.format(arith_dict[op], operand))
+        elif op in ('/', '%'):
+            if operand.startswith('$'):
+                self._out('\tmovl\t{}, %ecx\n'.format(operand))
+                operand = '%ecx'
+            self._out('\tcltd\n\tidivl\t{}\n'.format(operand))
+            if op == '%':
+                self._out('\tmovl\t%edx, %eax\n')
+        elif op in ('<<', '>>'):
+            self._out('\tmovl\t{}, %ecx\n'.format(operand))
+            self._out('\t{}\t%cl, %eax\n'.format('sall' if op == '<<' else 'sarl'))
+        elif op in cond_dict:
+            self._out('\tcmpl\t{}, %eax\n'.format(operand))
+            self._out('\tset{}\t%al\n\tmovzbl\t%al, %eax\n'.format(cond_dict[op]))
+        else:
+            raise TypeError('快速模式不支持运算符 {}'.format(op))
+
+    def _branch(self, cond, falselabel):
+        """ cond 为假时跳转到 falselabel，为真时顺序执行
+        """
+        if isinstance(cond, c_ast.BinaryOp) and cond.op in cond_dict:
+            right = self._operand(cond.right)
+            if right is None:
+                self.visit(cond.right)
+                right = self._push_temp()
+                self._out('\tmovl\t%eax, {}\n'.format(right))
+                self.visit(cond.left)
+                self._pop_temp()
+            else:
+                self.visit(cond.left)
+            self._out('\tcmpl\t{}, %eax\n'.format(right))
+            self._out('\tj{}\t{}\n'.format(cond_dict[_negate[cond.op]], falselabel))
+        else:
+            self.visit(cond)
+            self._out('\tcmpl\t$0, %eax\n\tje\t{}\n'.format(falselabel))
+
+    def _loop(self, init, cond, next, stmt, test_first=True):
+        beginlabel = self._newlabel()
+        nextlabel = self._newlabel()
+        endlabel = self._newlabel()
+        self.scopes.append({})
+        if init is not None:
+            self.visit(init)
+        self._emitlabel(beginlabel)
+        if test_first and cond is not None:
+            self._branch(cond, endlabel)
+        self.loops.append((nextlabel, endlabel))
+        self.visit(stmt)
+        self.loops.pop()
+        self._emitlabel(nextlabel)
+        if next is not None:
+            self.visit(next)
+        if test_first or cond is None:
+            self._out('\tjmp\t{}\n'.format(beginlabel))
+        else:
+            self._branch(cond, endlabel)
+            self._out('\tjmp\t{}\n'.format(beginlabel))
+        self._emitlabel(endlabel)
+        self.scopes.pop()
+
+    def visit(self, node):
+        method = 'visit_' + node.__class__.__name__
+        return getattr(self, method)(node)
+
+    def visit_FileAST(self, node):
+        for ext in node.ext:
+            if isinstance(ext, c_ast.FuncDef):
+                self.visit(ext)
+
+    def visit_FuncDef(self, node):
+        funcname = node.decl.name
+        self.body = []
+        self.frame_size = 0
+        self.args_size = 0
+        self.temp_slots = []
+        self.temp_depth = 0
+        self.strings = {}
+        self.scopes = [{}]
+        self.chars = set()  # char 局部变量的栈位
+        self.loops = []
+        self.exitlabel = self._newlabel()
+
+        params = node.decl.type.args.params if node.decl.type.args else []
+        for i, param in enumerate(params):
+            if param.name is not None:
+                self.scopes[0][param.name] = '{}(%ebp)'.format(2 * WORD_SIZE + i * WORD_SIZE)
+
+        self.visit(node.body)
+
+        stacksize = self.frame_size + self.args_size
+        stacksize = (stacksize + 15) // 16 * 16
+        head = []
+        if self.func_count > 0:
+            head.append('LFE1{}:\n'.format(self.func_count - 1))
+        if self.strings:
+            head.append('\t.section .rdata,"dr"\n')
+            for s, n in self.strings.items():
+                head.append('LC{}:\n\t.ascii "{}\\0"\n'.format(n, s))
+            head.append('\t.text\n')
+        head.append('\t.globl\t_{0}\n\t.def\t_{0}; .scl	2;	.type	32;	.endef\n'.format(funcname))
+        head.append('_{}:\nLFB1{}:\n'.format(funcname, self.func_count))
+        head.append('\t.cfi_startproc\n\tpushl	%ebp\n\t.cfi_def_cfa_offset 8\n\t.cfi_offset 5, -8\n\tmovl	%esp, %ebp\n\t.cfi_def_cfa_register 5\n')
+        if funcname == 'main':
+            head.append('\tandl	$-16, %esp\n')
+        if stacksize > 0:
+            head.append('\tsubl	${}, %esp\n'.format(stacksize))
+        if funcname == 'main':
+            head.append('\tcall\t___main\n')
+
+        self.body.append('{}:\n'.format(self.exitlabel))
+        if stacksize > 0 or funcname == 'main':
+            self.body.append('\tleave\n')
+        else:
+            self.body.append('\tpopl\t%ebp\n')
+        self.body.append('\t.cfi_restore 5\n\t.cfi_def_cfa 4, 4\n\tret\n\t.cfi_endproc\n')
+
+        self.asmtext += ''.join(head) + ''.join(self.body)
+        self.func_count += 1
+
+    def visit_Compound(self, node):
+        self.scopes.append({})
+        for item in node.block_items or []:
+            self.visit(item)
+        self.scopes.pop()
+
+    def visit_DeclList(self, node):
+        for decl in node.decls:
+            self.visit(decl)
+
+    def visit_Decl(self, node):
+        if isinstance(node.type, c_ast.TypeDecl):
+            slot = self._alloc()
+            if node.type.type.names[0] == 'char':
+                self.chars.add(slot)
+            if node.init is not None:
+                self._store(node.init, slot)
+            self.scopes[-1][node.name] = slot
+
+    def _store(self, expr, dest):
+        operand = self._operand(expr)
+        if operand is not None and operand.startswith('$') and dest not in self.chars:
+            self._out('\tmovl\t{}, {}\n'.format(operand, dest))
+        else:
+            self.visit(expr)
+            self._assign(dest)
+
+    def _assign(self, var):
+        # 把 %eax 写入变量，char 变量先截断，%eax 也随之成为赋值表达式截断后的值
+        if var in self.chars:
+            self._out('\tmovsbl\t%al, %eax\n')
+        self._out('\tmovl\t%eax, {}\n'.format(var))
+
+    def visit_EmptyStatement(self, node):
+        pass
+
+    def visit_If(self, node):
+        falselabel = self._newlabel()
+        self._branch(node.cond, falselabel)
+        self.visit(node.iftrue)
+        if node.iffalse:
+            endlabel = self._newlabel()
+            self._out('\tjmp\t{}\n'.format(endlabel))
+            self._emitlabel(falselabel)
+            self.visit(node.iffalse)
+            self._emitlabel(endlabel)
+        else:
+            self._emitlabel(falselabel)
+
+    def visit_While(self, node):
+        self._loop(None, node.cond, None, node.stmt)
+
+    def visit_DoWhile(self, node):
+        self._loop(None, node.cond, None, node.stmt, test_first=False)
+
+    def visit_For(self, node):
+        self._loop(node.init, node.cond, node.next, node.stmt)
+
+    def visit_Break(self, node):
+        self._out('\tjmp\t{}\n'.format(self.loops[-1][1]))
+
+    def visit_Continue(self, node):
+        self._out('\tjmp\t{}\n'.format(self.loops[-1][0]))
+
+    def visit_Return(self, node):
+        if node.expr is not None:
+            self.visit(node.expr)
+        self._out('\tjmp\t{}\n'.format(self.exitlabel))
+
+    def visit_Constant(self, node):
+        self._out('\tmovl\t{}, %eax\n'.format(self._operand(node)))
+
+    def visit_ID(self, node):
+        self._out('\tmovl\t{}, %eax\n'.format(self._lookup(node.name)))
+
+    def visit_Cast(self, node):
+        self.visit(node.expr)
+
+    def visit_ExprList(self, node):
+        for expr in node.exprs:
+            self.visit(expr)
+
+    def visit_BinaryOp(self, node):
+        if node.op in ('&&', '||'):
+            endlabel = self._newlabel()
+            self.visit(node.left)
+            self._out('\tcmpl\t$0, %eax\n\t{}\t{}\n'.format('je' if node.op == '&&' else 'jne', endlabel))
+            self.visit(node.right)
+            self._emitlabel(endlabel)
+            self._out('\tcmpl\t$0, %eax\n\tsetne\t%al\n\tmovzbl\t%al, %eax\n')
+            return
+        right = self._operand(node.right)
+        if right is None:
+            self.visit(node.right)
+            right = self._push_temp()
+            self._out('\tmovl\t%eax, {}\n'.format(right))
+            self.visit(node.left)
+            self._apply(node.op, right)
+            self._pop_temp()
+        else:
+            self.visit(node.left)
+            self._apply(node.op, right)
+
+    def visit_TernaryOp(self, node):
+        falselabel = self._newlabel()
+        endlabel = self._newlabel()
+        self._branch(node.cond, falselabel)
+        self.visit(node.iftrue)
+        self._out('\tjmp\t{}\n'.format(endlabel))
+        self._emitlabel(falselabel)
+        self.visit(node.iffalse)
+        self._emitlabel(endlabel)
+
+    def visit_UnaryOp(self, node):
+        if node.op == '+':
+            self.visit(node.expr)
+        elif node.op == '-':
+            self.visit(node.expr)
+            self._out('\tnegl\t%eax\n')
+        elif node.op == '~':
+            self.visit(node.expr)
+            self._out('\tnotl\t%eax\n')
+        elif node.op == '!':
+            self.visit(node.expr)
+            self._out('\tcmpl\t$0, %eax\n\tsete\t%al\n\tmovzbl\t%al, %eax\n')
+        elif node.op in ('++', '--', 'p++', 'p--'):  # 以 p 开头的是后缀形式
+            var = self._lookup(node.expr.name)
+            inst = 'addl' if node.op.endswith('++') else 'subl'
+            if var in self.chars:
+                # 经过寄存器截断，后缀形式在 %ecx 中计算新值，%eax 保留原值
+                reg, low = ('%ecx', '%cl') if node.op.startswith('p') else ('%eax', '%al')
+                self._out('\tmovl\t{}, %eax\n'.format(var))
+                if reg != '%eax':
+                    self._out('\tmovl\t%eax, %ecx\n')
+                self._out('\t{0}\t$1, {1}\n\tmovsbl\t{2}, {1}\n\tmovl\t{1}, {3}\n'.format(inst, reg, low, var))
+            elif node.op.startswith('p'):
+                self._out('\tmovl\t{0}, %eax\n\t{1}\t$1, {0}\n'.format(var, inst))
+            else:
+                self._out('\t{1}\t$1, {0}\n\tmovl\t{0}, %eax\n'.format(var, inst))
+        else:
+            raise TypeError('快速模式不支持运算符 {}'.format(node.op))
+
+    def visit_Assignment(self, node):
+        var = self._lookup(node.lvalue.name)
+        if node.op == '=':
+            self.visit(node.rvalue)
+            self._assign(var)
+        else:
+            right = self._operand(node.rvalue)
+            if right is None:
+                self.visit(node.rvalue)
+                right = self._push_temp()
+                self._out('\tmovl\t%eax, {}\n'.format(right))
+                self._pop_temp()
+            self._out('\tmovl\t{}, %eax\n'.format(var))
+            self._apply(node.op[:-1], right)
+            self._assign(var)
+
+    def visit_FuncCall(self, node):
+        args = node.args.exprs if node.args else []
+        self.args_size = max(self.args_size, len(args) * WORD_SIZE)
+        # 复杂的实参可能含有函数调用，会覆盖栈顶的参数区，先求值到临时栈位
+        values = []
+        temps = 0
+        for arg in args:
+            operand = self._operand(arg)
+            if operand is None:
+                self.visit(arg)
+                operand = self._push_temp()
+                temps += 1
+                self._out('\tmovl\t%eax, {}\n'.format(operand))
+            values.append(operand)
+        for i, operand in enumerate(values):
+            dest = '{}(%esp)'.format(i * WORD_SIZE or '')
+            if operand.startswith('$'):
+                self._out('\tmovl\t{}, {}\n'.format(operand, dest))
+            else:
+                self._out('\tmovl\t{}, %eax\n\tmovl\t%eax, {}\n'.format(operand, dest))
+        for _ in range(temps):
+            self._pop_temp()
+        self._out('\tcall\t_{}\n'.format(node.name.name))
+
+
+_negate = {'>': '<=', '<': '>=', '==': '!=', '>=': '<', '<=': '>', '!=': '=='}
+
@@ -0,0 +1,161 @@
+# ------------------------------------------------
+# bwcc: c_fold.py
+#
+# 常量折叠与常量传播：计算常量运算，化简代数恒等式，把条件已知的跳转改为无条件跳转
+# ------------------------------------------------
+from c_ir import MCode, Imm, stored
+
+INT_MIN = -2 ** 31
+
+BINARY_OPS = ('+', '-', '*', '/', '%', '>', '<', '==', '>=', '<=', '!=')
+BRANCH_OPS = {'j>': '>', 'j<': '<', 'j==': '==', 'j>=': '>=', 'j<=': '<=', 'j!=': '!='}
+
+
+def wrap(value):
+    """ 截断为 32 位有符号整数 """
+    value &= 0xffffffff
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def evaluate(op, a, b):
+    """ 按 32 位 int 的语义计算 a op b，结果未定义（如除以 0）时返回 None """
+    if op == '+':
+        return wrap(a + b)
+    elif op == '-':
+        return wrap(a - b)
+    elif op == '*':
+        return wrap(a * b)
+    elif op in ('/', '%'):
+        if b == 0 or (a == INT_MIN and b == -1):  # idivl 会产生异常
+            return None
+        q = abs(a) // abs(b)
+        if (a < 0) != (b < 0):
+            q = -q
+        return q if op == '/' else a - b * q
+    elif op == '>':
+        return int(a > b)
+    elif op == '<':
+        return int(a < b)
+    elif op == '==':
+        return int(a == b)
+    elif op == '>=':
+        return int(a >= b)
+    elif op == '<=':
+        return int(a <= b)
+    elif op == '!=':
+        return int(a != b)
+    return None
+
+
+def simplify(op, a, b):
+    """ 代数化简，a、b 中至多一个为 Imm。
+
+    Returns:
+        与 a op b 相等的操作数，不能化简时返回 None
+    """
+    left = a.value if isinstance(a, Imm) else None
+    right = b.value if isinstance(b, Imm) else None
+    if op == '+':
+        if left == 0:
+            return b
+        if right == 0:
+            return a
+    elif op == '-':
+        if right == 0:
+            return a
+        if a is b:
+            return Imm(0)
+    elif op == '*':
+        if left == 1:
+            return b
+        if right == 1:
+            return a
+        if left == 0 or right == 0:
+            return Imm(0)
+    elif op == '/':
+        if right == 1:
+            return a
+    elif op == '%':
+        if right == 1 or right == -1:
+            return Imm(0)
+    elif op in ('==', '>=', '<=') and a is b:
+        return Imm(1)
+    elif op in ('!=', '>', '<') and a is b:
+        return Imm(0)
+    return None
+
+
+def fold_constants(cfg, frame):
+    """ 在扩展基本块内做常量传播和常量折叠。
+
+    按逆后序处理各块，只有一个前驱的块继承前驱末尾已知的常量。子集中没有
+    指针，函数调用也不会修改本函数的变量，块内的常量只会被显式的赋值改变。
+    条件已知的条件跳转改为无条件跳转或删去，之后重新建立 CFG 的边，变得
+    不可达的块留给死代码删除。存入 char 变量的常量先截断为 char 的取值，
+    与汇编中 movb 写入后读出的值相同。
+
+    Returns:
+        改动的四元式条数
+    """
+    changed = 0
+    branches = False
+    known_out = {}
+    for block in cfg.reverse_postorder():
+        if len(block.preds) == 1 and block.preds[0] in known_out:
+            known = dict(known_out[block.preds[0]])
+        else:
+            known = {}
+
+        codes = []
+        for code in block.codes:
+            op = code.op
+            if op == 'phi':
+                known.pop(code.result, None)
+                codes.append(code)
+                continue
+            for field in code.use_fields():
+                value = getattr(code, field)
+                if value in known:
+                    setattr(code, field, Imm(known[value]))
+                    changed += 1
+
+            if op in BRANCH_OPS:
+                result = _fold(BRANCH_OPS[op], code.arg1, code.arg2)
+                if result is not None:
+                    branches = True
+                    changed += 1
+                    if result.value:
+                        codes.append(MCode('j', None, None, code.result))
+                    continue  # 条件不成立，顺序执行到下一块
+            elif op in BINARY_OPS:
+                result = _fold(op, code.arg1, code.arg2)
+                if result is not None:
+                    code.op, code.arg1, code.arg2 = '=', result, None
+                    changed += 1
+
+            dest = code.dest()
+            if dest is not None:
+                if code.op == '=' and isinstance(code.arg1, Imm):
+                    if code.narrows():
+                        code.arg1 = Imm(stored(code.arg1.value, dest))
+                        changed += 1
+                    known[dest] = code.arg1.value
+                else:
+                    known.pop(dest, None)
+            codes.append(code)
+        block.codes = codes
+        known_out[block] = known
+
+    if branches:
+        cfg.link()
+    return changed
+
+
+def _fold(op, a, b):
+    """ 常量折叠或代数化简 a op b，不能化简时返回 None """
+    if isinstance(a, Imm) and isinstance(b, Imm):
+        value = evaluate(op, a.value, b.value)
+        return None if value is None else Imm(value)
+    if a is None or b is None or a.kind in ('str', 'call') or b.kind in ('str', 'call'):
+        return None
+    return simplify(op, a, b)
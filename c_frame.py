@@ -0,0 +1,58 @@
+# ------------------------------------------------
+# bwcc: c_frame.py
+#
+# 栈帧布局：按生存期给临时变量着色，生存期不相交的临时变量共用一个栈槽
+# ------------------------------------------------
+from c_dataflow import Liveness, iter_bits
+from c_ir import Temp, TYPE_WIDTH
+
+
+def temp_slot_colors(cfg):
+    """ 给 cfg 中的临时变量着色，返回 {Temp: 颜色}。
+
+    两个临时变量冲突，当且仅当其中一个的定值点之后另一个仍然活跃（拷贝的源
+    除外），这时它们不能共用栈槽。即使定值的结果不活跃，写入也会覆盖栈槽，
+    所以按定值点而不是按活跃区间判断。按第一次出现的顺序贪心着色，颜色
+    相同的临时变量宽度也相同。局部变量仍各占一个栈槽。
+    """
+    liveness = Liveness(cfg)
+    temps = 0
+    order = []
+    for sym in liveness.variables:
+        if isinstance(sym, Temp):
+            temps |= liveness.bit(sym)
+            order.append(sym)
+    if not order:
+        return {}
+
+    edges = {}
+    for block in cfg.blocks:
+        for code, live in liveness.walk_backward(block):
+            dest = code.dest()
+            if not isinstance(dest, Temp):
+                continue
+            bit = liveness.bit(dest)
+            others = live & temps & ~bit
+            if code.op == '=' and isinstance(code.arg1, Temp):
+                others &= ~liveness.bit(code.arg1)
+            if others:
+                edges[bit] = edges.get(bit, 0) | others
+                for i in iter_bits(others):
+                    edges[1 << i] = edges.get(1 << i, 0) | bit
+
+    colors = {}
+    width_of = []  # 每种颜色的宽度
+    for sym in order:
+        used = set()
+        for i in iter_bits(edges.get(liveness.bit(sym), 0)):
+            neighbour = liveness.variables[i]
+            if neighbour in colors:
+                used.add(colors[neighbour])
+        width = TYPE_WIDTH[sym.type]
+        color = 0
+        while color < len(width_of) and (color in used or width_of[color] != width):
+            color += 1
+        if color == len(width_of):
+            width_of.append(width)
+        colors[sym] = color
+    return colors
@@ -0,0 +1,104 @@
+# ------------------------------------------------
+# bwcc: c_index.py
+#
+# ASTIndex class: 为 FileAST 建立按结点类型、名称、被调函数的索引
+# ------------------------------------------------
+import c_ast
+
+
+class ASTIndex(object):
+    """ FileAST 的查询索引。
+
+    建立索引时遍历一次整棵树，之后的查询只与结果的规模有关，不再需要
+    NodeVisitor 遍历。替换某个 FuncDef 时只更新该函数贡献的索引项。
+
+    开启 intern_leaves 的 CParser 会让多个位置共享同一个叶子结点，因此索引
+    中的每一项都带有引用计数，查询结果里每个结点只出现一次，顺序为结点加入
+    索引的顺序。
+
+    Attributes:
+        ast: 被索引的 FileAST
+    """
+    def __init__(self, ast):
+        self.ast = ast
+
+        # 各个表的结构都是 {key: {id(node): [node, 引用计数]}}
+        self._by_type = {}  # 结点类 -> 结点
+        self._by_name = {}  # 名称 -> Decl、FuncDef 结点
+        self._by_callee = {}  # 被调函数名 -> FuncCall 结点
+
+        # 每个顶层结点贡献的索引项 {id(ext): [(表, key, node)]}
+        self._entries = {}
+        # 顶层结点在 ast.ext 中的位置 {id(ext): 下标}
+        self._position = {}
+
+        for i, ext in enumerate(ast.ext):
+            self._position[id(ext)] = i
+            self._add(ext)
+
+    def nodes(self, *classes):
+        """ 返回属于 classes 中任意一个结点类的所有结点。
+
+        例如 nodes(c_ast.For, c_ast.While, c_ast.DoWhile) 列出所有循环。
+        """
+        result = []
+        for cls in classes:
+            result.extend(item[0] for item in self._by_type.get(cls, {}).values())
+        return result
+
+    def definitions(self, name):
+        """ 返回名为 name 的 Decl 和 FuncDef 结点，用于跳转到定义。
+        """
+        return [item[0] for item in self._by_name.get(name, {}).values()]
+
+    def calls(self, callee):
+        """ 返回所有调用 callee 的 FuncCall 结点。
+        """
+        return [item[0] for item in self._by_callee.get(callee, {}).values()]
+
+    def replace_funcdef(self, old, new):
+        """ 用 new 替换 ast.ext 中的 FuncDef 结点 old，并增量更新索引。
+        """
+        i = self._position.pop(id(old), None)
+        if i is None:
+            raise KeyError('{} 不是被索引的 FileAST 的顶层结点'.format(old))
+        self._remove(old)
+        self.ast.ext[i] = new
+        self._position[id(new)] = i
+        self._add(new)
+
+    #################### PRIVATE ####################
+
+    def _add(self, ext):
+        entries = []
+        stack = [ext]
+        while stack:
+            node = stack.pop()
+            entries.append((self._by_type, node.__class__, node))
+            if isinstance(node, c_ast.FuncDef):
+                entries.append((self._by_name, node.decl.name, node))
+            elif isinstance(node, c_ast.Decl) and node.name is not None:
+                entries.append((self._by_name, node.name, node))
+            elif isinstance(node, c_ast.FuncCall) and isinstance(node.name, c_ast.ID):
+                entries.append((self._by_callee, node.name.name, node))
+            # 逆序压栈，使结点按先序加入索引
+            stack.extend(reversed([child for _, child in node.children()]))
+
+        for table, key, node in entries:
+            bucket = table.setdefault(key, {})
+            item = bucket.get(id(node))
+            if item is None:
+                bucket[id(node)] = [node, 1]
+            else:
+                item[1] += 1
+        self._entries[id(ext)] = entries
+
+    def _remove(self, ext):
+        for table, key, node in self._entries.pop(id(ext)):
+            bucket = table[key]
+            item = bucket[id(node)]
+            item[1] -= 1
+            if item[1] == 0:
+                del bucket[id(node)]
+                if not bucket:
+                    del table[key]
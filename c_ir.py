@@ -0,0 +1,285 @@
+# ------------------------------------------------
+# bwcc: c_ir.py
+#
+# 中间代码使用的数据结构：四元式、符号和栈帧
+# ------------------------------------------------
+TYPE_WIDTH = {'int': 4, 'char': 1}
+WORD_SIZE = 4
+
+
+class MCode(object):
+    """ 四元式类
+    (jnz, a, -, p)
+
+    使用 __slots__ 而不是实例字典，每条四元式从 112 字节降到 72 字节。
+    op 为驻留的字符串常量；标号为整数，
+    只在输出时加上前缀 L；变量和临时变量都是 Symbol。
+
+    SSA 形式中另有 (phi, {前驱基本块: 操作数}, -, 变量)，只出现在基本块开头。
+    """
+    __slots__ = ('op', 'arg1', 'arg2', 'result')
+
+    def __init__(self, op, arg1, arg2, result):
+        self.op = op
+        self.arg1 = arg1
+        self.arg2 = arg2
+        self.result = result
+
+    def __repr__(self):
+        result = self.result
+        if result is not None and self.op[0] in ('j', 'l'):  # j、j<cond> 和 label 的 result 是标号
+            result = 'L' + str(result)
+        return '({}, {}, {}, {})'.format(self.op, self.arg1 if self.arg1 != None else '-',
+                                         self.arg2 if self.arg2 != None else '-',
+                                         result if result != None else '-')
+
+    def __str__(self):
+        return self.__repr__()
+
+    def use_fields(self):
+        """ 读取操作数的字段名，phi 的操作数在 arg1 的字典中，不在此列 """
+        return USE_FIELDS.get(self.op, ('arg1', 'arg2'))  # =、运算和 j<cond>
+
+    def uses(self):
+        """ 读取的栈帧变量（Symbol）列表 """
+        if self.op == 'phi':
+            args = self.arg1.values()
+        else:
+            args = [getattr(self, field) for field in self.use_fields()]
+        return [arg for arg in args if isinstance(arg, Symbol)]
+
+    def dest(self):
+        """ 写入的栈帧变量，没有则为 None """
+        if self.op in ('func', 'endfunc', 'param', 'call', 'return', 'label') or self.op[0] == 'j':
+            return None
+        return self.result
+
+    def narrows(self):
+        """ 是否为截断的赋值：把一个字的值存入 char 变量，只保留低 8 位。
+
+        之后 result 与源不一定相等，不能把它当作拷贝传播或给两者相同的值编号。
+        char 变量之间的复制和 char 取值范围内的立即数不截断。运算的结果总是
+        int 临时变量，只有赋值会截断。
+        """
+        if self.op != '=' or not is_byte(self.result):
+            return False
+        if self.arg1.kind == 'imm':
+            return stored(self.arg1.value, self.result) != self.arg1.value
+        return not is_byte(self.arg1)
+
+
+def is_byte(value):
+    """ 是否为只占一个字节的 char 局部变量或临时变量，形参由调用者按字传递 """
+    return isinstance(value, Symbol) and value.kind in ('local', 'temp') and TYPE_WIDTH[value.type] == 1
+
+
+def stored(value, dest):
+    """ 整数 value 存入 dest 后读出的值：char 变量保留低 8 位并作符号扩展，与 movb、movsbl 一致 """
+    if not is_byte(dest):
+        return value
+    value &= 0xff
+    return value - 0x100 if value & 0x80 else value
+
+
+USE_FIELDS = {'param': ('arg2',), 'return': ('result',),
+              'func': (), 'endfunc': (), 'call': (), 'label': (), 'j': (), 'phi': ()}
+
+
+class Operand(object):
+    """ 四元式的操作数，由 CTranslator 在翻译时确定种类。
+
+    CAssembler 根据 kind 直接生成立即数或内存操作数，不再分析字符串。
+    """
+    __slots__ = ()
+    kind = None
+
+
+class Imm(Operand):
+    """ 整数立即数，字符常量也转换为整数 """
+    __slots__ = ('value',)
+    kind = 'imm'
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return str(self.value)
+
+
+class StrConst(Operand):
+    """ 字符串常量，index 是它在常量表中的序号，汇编中为标号 LC<index> """
+    __slots__ = ('index',)
+    kind = 'str'
+
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return 'LC' + str(self.index)
+
+
+class CallResult(Operand):
+    """ 函数调用的返回值，即调用后的 %eax，在下一次调用前有效 """
+    __slots__ = ('func',)
+    kind = 'call'
+
+    def __init__(self, func):
+        self.func = func
+
+    def __repr__(self):
+        return '_' + self.func
+
+
+class Symbol(Operand):
+    """ 栈帧中的一个变量，由子类 Local、Param、Temp 区分种类。
+
+    四元式直接引用 Symbol 对象，翻译和汇编时不再按名字查找符号表。
+
+    Attributes:
+        name: 变量名，只用于输出
+        type: 类型名，如 'int'
+        slot: 在所属栈帧中的序号，形参为第几个参数
+        offset: 局部变量和临时变量相对于 %esp 的偏移量，由 Frame.layout()
+            计算；形参相对于 %ebp 的偏移量，创建时即确定
+    """
+    __slots__ = ('name', 'type', 'slot', 'offset')
+
+    def __init__(self, name, type, slot):
+        self.name = name
+        self.type = type
+        self.slot = slot
+        self.offset = None
+
+    def __repr__(self):
+        return self.name
+
+    def __str__(self):
+        return self.name
+
+
+class Local(Symbol):
+    __slots__ = ()
+    kind = 'local'
+
+
+class Param(Symbol):
+    __slots__ = ()
+    kind = 'param'
+
+
+class Temp(Symbol):
+    __slots__ = ()
+    kind = 'temp'
+
+
+class Frame(object):
+    """ 函数的栈帧。
+
+    自高地址向低地址依次为：调用者传入的实参、返回地址、保存的 %ebp（省略帧
+    指针时没有）、按宽度从大到小排列的变量，以及栈顶的传参区。
+
+    Attributes:
+        name: 函数名
+        symbols: 按 slot 排列的局部变量和临时变量
+        params: 按顺序排列的形参，位于调用者的栈帧中
+        stacksize: layout() 之前为变量宽度之和，之后为 %esp 需要下移的字节数
+        outgoing: 传参区的大小，即各调用点实参所占空间的最大值
+        leaf: 函数中没有调用
+        frame_pointer: 是否使用 %ebp 作为帧指针，由 layout() 决定
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.symbols = []
+        self.params = []
+        self.stacksize = 0
+        self.outgoing = 0
+        self.leaf = True
+        self.frame_pointer = True
+        self.laid_out = False
+
+    def _new_symbol(self, cls, name, type):
+        sym = cls(name, type, len(self.symbols))
+        self.symbols.append(sym)
+        self.stacksize += TYPE_WIDTH[type]
+        return sym
+
+    def new_local(self, name, type):
+        return self._new_symbol(Local, name, type)
+
+    def new_temp(self, name, type):
+        return self._new_symbol(Temp, name, type)
+
+    def new_version(self, sym, name):
+        """ 与 sym 同种类、同类型的新变量，用于 SSA 形式中的各个版本 """
+        return self._new_symbol(sym.__class__, name, sym.type)
+
+    def drop_unused(self, used):
+        """ 删去不在 used 中的局部变量和临时变量，重新编号 slot，只能在 layout() 之前调用 """
+        symbols = []
+        for sym in self.symbols:
+            if sym in used:
+                sym.slot = len(symbols)
+                symbols.append(sym)
+            else:
+                self.stacksize -= TYPE_WIDTH[sym.type]
+        self.symbols = symbols
+
+    def new_param(self, name, type):
+        # 返回地址和保存的 %ebp 之上依次是各个实参
+        sym = Param(name, type, len(self.params))
+        sym.offset = 2 * WORD_SIZE + sym.slot * WORD_SIZE
+        self.params.append(sym)
+        return sym
+
+    def new_call(self, nargs):
+        """ 记录一个有 nargs 个实参的调用点，各调用点共用栈顶的传参区 """
+        self.outgoing = max(self.outgoing, nargs * WORD_SIZE)
+        self.leaf = False
+
+    def layout(self, colors=None, omit_frame_pointer=False):
+        """ 根据各变量的类型计算栈帧大小和每个变量的偏移量，只计算一次。
+
+        变量按宽度从大到小排在传参区之上，char 紧密排列，不再各占一个字。
+        只有调用点要求 %esp 按 16 字节对齐：有调用的函数补齐到调用时对齐，
+        叶函数只按字对齐。
+
+        Args:
+            colors: {Temp: 颜色}，颜色相同的临时变量共用一个栈槽，见 c_frame
+            omit_frame_pointer: 不保存 %ebp，形参也相对于 %esp 访问。main 需要
+                用 %ebp 恢复对齐前的 %esp，总是保留帧指针
+        """
+        if self.laid_out:
+            return
+        colors = colors or {}
+        slots = []  # [(宽度, 共用这个栈槽的变量)]
+        shared = {}  # {颜色: 栈槽}
+        for sym in self.symbols:
+            color = colors.get(sym)
+            if color in shared:
+                shared[color][1].append(sym)
+                continue
+            slot = (TYPE_WIDTH[sym.type], [sym])
+            slots.append(slot)
+            if color is not None:
+                shared[color] = slot
+        offset = self.outgoing
+        for width, syms in sorted(slots, key=lambda slot: -slot[0]):  # 稳定排序，同宽度保持原顺序
+            for sym in syms:
+                sym.offset = offset
+            offset += width
+        self.frame_pointer = not omit_frame_pointer or self.name == 'main'
+        size = -(-offset // WORD_SIZE) * WORD_SIZE
+        if not self.leaf or self.name == 'main':
+            # main 先把 %esp 对齐到 16 字节；其它函数入口处已压入返回地址，可能还有 %ebp
+            if self.name == 'main':
+                pushed = 0
+            else:
+                pushed = 2 * WORD_SIZE if self.frame_pointer else WORD_SIZE
+            size += -(size + pushed) % 16
+        self.stacksize = size
+        self.laid_out = True
+
+    def __repr__(self):
+        return repr({'symbols': {sym.name: sym.offset for sym in self.params + self.symbols},
+                     'stacksize': self.stacksize})
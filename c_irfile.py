@@ -0,0 +1,335 @@
+# ------------------------------------------------
+# bwcc: c_irfile.py
+#
+# 中间代码的文本格式和二进制格式，用于保存和读取四元式及 get_tables() 的结果
+# ------------------------------------------------
+import io
+import json
+
+from c_ir import MCode, Imm, StrConst, CallResult, Frame
+
+TEXT_MAGIC = 'bwcc-ir 1'
+BINARY_MAGIC = b'BWIR\x02'
+BINARY_MAGIC_V1 = b'BWIR\x01'  # 没有帧指针标志，读取时总是使用帧指针
+
+# 文本格式，每行一条记录：
+#
+#     bwcc-ir 1
+#     .string <序号> <所属函数> <JSON 字符串>
+#     .frame <函数名> <stacksize> [nofp]           nofp 表示省略帧指针
+#     .param|.local|.temp <名字> <类型> <偏移量>    按 slot 顺序，属于上一个 .frame
+#     <op> <arg1> <arg2> <result>                   四元式
+#
+# 四元式的各个字段：
+#     -           None
+#     123         整数（param 的序号和参数个数、标号）
+#     #-5         Imm
+#     $3          StrConst
+#     @printf     CallResult
+#     %3          所在函数的第 3 个局部变量或临时变量
+#     ^0          所在函数的第 0 个形参
+#     main        名字（func、call 的函数名）
+
+
+def save_ir(filename, codes, tables):
+    """ 保存中间代码，文件名以 .irb 结尾时使用二进制格式
+    """
+    if filename.endswith('.irb'):
+        with open(filename, 'wb') as f:
+            f.write(dump_binary(codes, tables))
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(dump_text(codes, tables))
+
+
+def load_ir(filename):
+    """ 读取 save_ir() 保存的中间代码，根据文件头判断格式
+
+    Returns:
+        (codes, tables)，可以直接交给 CAssembler
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if data.startswith(BINARY_MAGIC) or data.startswith(BINARY_MAGIC_V1):
+        return load_binary(data)
+    return load_text(data.decode('utf-8'))
+
+
+#################### 文本格式 ####################
+
+def dump_text(codes, tables):
+    out = io.StringIO()
+    out.write(TEXT_MAGIC + '\n')
+    for s, (func, index) in tables['constant_table'].items():
+        out.write('.string {} {} {}\n'.format(index, func, json.dumps(s)))
+    frames = tables['symbol_table']
+    for code in codes:
+        if code.op == 'func':
+            frame = frames[code.result]
+            out.write('.frame {} {}{}\n'.format(frame.name, frame.stacksize,
+                                               '' if frame.frame_pointer else ' nofp'))
+            for sym in frame.params + frame.symbols:
+                out.write('.{} {} {} {}\n'.format(sym.kind, sym.name, sym.type, sym.offset))
+        out.write('{} {} {} {}\n'.format(code.op, _text_field(code.arg1),
+                                         _text_field(code.arg2), _text_field(code.result)))
+    return out.getvalue()
+
+
+def _text_field(value):
+    if value is None:
+        return '-'
+    if isinstance(value, (int, str)):
+        return str(value)
+    kind = value.kind
+    if kind == 'imm':
+        return '#{}'.format(value.value)
+    elif kind == 'str':
+        return '${}'.format(value.index)
+    elif kind == 'call':
+        return '@' + value.func
+    elif kind == 'param':
+        return '^{}'.format(value.slot)
+    else:
+        return '%{}'.format(value.slot)
+
+
+def load_text(text):
+    lines = text.splitlines()
+    if not lines or lines[0] != TEXT_MAGIC:
+        raise ValueError('不是 bwcc 中间代码文件')
+    constant_table = {}
+    frames = {}
+    stacksizes = {}
+    codes = []
+    frame = None
+    for lineno, line in enumerate(lines[1:], 2):
+        if not line:
+            continue
+        head, _, rest = line.partition(' ')
+        if head == '.string':
+            index, func, s = rest.split(' ', 2)
+            constant_table[json.loads(s)] = (func, int(index))
+        elif head == '.frame':
+            name, stacksize, *flags = rest.split()
+            frame = frames[name] = Frame(name)
+            frame.frame_pointer = 'nofp' not in flags
+            stacksizes[name] = int(stacksize)
+        elif head in ('.param', '.local', '.temp'):
+            name, type, offset = rest.split()
+            _add_symbol(frame, head[1:], name, type, int(offset))
+        else:
+            fields = rest.split()
+            if len(fields) != 3:
+                raise ValueError('第 {} 行格式错误：{}'.format(lineno, line))
+            codes.append(MCode(head, *[_parse_field(field, frame) for field in fields]))
+    for name, frame in frames.items():
+        frame.stacksize = stacksizes[name]  # new_local()、new_temp() 会累加 stacksize
+        frame.laid_out = True
+    return codes, {'constant_table': constant_table, 'symbol_table': frames}
+
+
+def _parse_field(field, frame):
+    c = field[0]
+    if field == '-':
+        return None
+    elif c == '#':
+        return Imm(int(field[1:]))
+    elif c == '$':
+        return StrConst(int(field[1:]))
+    elif c == '@':
+        return CallResult(field[1:])
+    elif c == '%':
+        return frame.symbols[int(field[1:])]
+    elif c == '^':
+        return frame.params[int(field[1:])]
+    elif field.lstrip('-').isdigit():
+        return int(field)
+    return field
+
+
+def _add_symbol(frame, kind, name, type, offset):
+    if kind == 'param':
+        sym = frame.new_param(name, type)
+    elif kind == 'local':
+        sym = frame.new_local(name, type)
+    else:
+        sym = frame.new_temp(name, type)
+    sym.offset = offset
+
+
+#################### 二进制格式 ####################
+#
+# 文件头之后依次是字符串表、常量表、栈帧表和四元式，整数都用 zigzag 变换后的
+# LEB128 变长编码，字符串都以其在字符串表中的序号表示。第 2 版起每个栈帧的
+# stacksize 之后有一个字节的帧指针标志。
+# 四元式的每个字段以一个标记字节开头：
+
+FIELD_NONE, FIELD_INT, FIELD_IMM, FIELD_STR, FIELD_CALL, FIELD_SYMBOL, FIELD_PARAM, FIELD_NAME = range(8)
+SYMBOL_KINDS = ('param', 'local', 'temp')
+
+
+def dump_binary(codes, tables):
+    strings = {}
+    body = bytearray()
+
+    def string(s):
+        if s not in strings:
+            strings[s] = len(strings)
+        _put_int(body, strings[s])
+
+    constant_table = tables['constant_table']
+    _put_int(body, len(constant_table))
+    for s, (func, index) in constant_table.items():
+        string(s)
+        string(func)
+        _put_int(body, index)
+
+    frames = tables['symbol_table']
+    _put_int(body, len(frames))
+    for frame in frames.values():
+        string(frame.name)
+        _put_int(body, frame.stacksize)
+        body.append(1 if frame.frame_pointer else 0)
+        symbols = frame.params + frame.symbols
+        _put_int(body, len(symbols))
+        for sym in symbols:
+            body.append(SYMBOL_KINDS.index(sym.kind))
+            string(sym.name)
+            string(sym.type)
+            _put_int(body, sym.offset)
+
+    codes = list(codes)
+    _put_int(body, len(codes))
+    for code in codes:
+        string(code.op)
+        for value in (code.arg1, code.arg2, code.result):
+            if value is None:
+                body.append(FIELD_NONE)
+            elif isinstance(value, int):
+                body.append(FIELD_INT)
+                _put_int(body, value)
+            elif isinstance(value, str):
+                body.append(FIELD_NAME)
+                string(value)
+            elif value.kind == 'imm':
+                body.append(FIELD_IMM)
+                _put_int(body, value.value)
+            elif value.kind == 'str':
+                body.append(FIELD_STR)
+                _put_int(body, value.index)
+            elif value.kind == 'call':
+                body.append(FIELD_CALL)
+                string(value.func)
+            elif value.kind == 'param':
+                body.append(FIELD_PARAM)
+                _put_int(body, value.slot)
+            else:
+                body.append(FIELD_SYMBOL)
+                _put_int(body, value.slot)
+
+    head = bytearray(BINARY_MAGIC)
+    _put_int(head, len(strings))
+    for s in strings:
+        data = s.encode('utf-8')
+        _put_int(head, len(data))
+        head += data
+    return bytes(head + body)
+
+
+def load_binary(data):
+    if data.startswith(BINARY_MAGIC):
+        version = 2
+    elif data.startswith(BINARY_MAGIC_V1):
+        version = 1
+    else:
+        raise ValueError('不是 bwcc 中间代码文件')
+    reader = _Reader(data, len(BINARY_MAGIC))
+    strings = []
+    for _ in range(reader.int()):
+        size = reader.int()
+        strings.append(reader.bytes(size).decode('utf-8'))
+
+    constant_table = {}
+    for _ in range(reader.int()):
+        s = strings[reader.int()]
+        func = strings[reader.int()]
+        constant_table[s] = (func, reader.int())
+
+    frames = {}
+    for _ in range(reader.int()):
+        frame = Frame(strings[reader.int()])
+        stacksize = reader.int()
+        if version > 1:
+            frame.frame_pointer = bool(reader.byte())
+        for _ in range(reader.int()):
+            kind = SYMBOL_KINDS[reader.byte()]
+            name = strings[reader.int()]
+            type = strings[reader.int()]
+            _add_symbol(frame, kind, name, type, reader.int())
+        frame.stacksize = stacksize
+        frame.laid_out = True
+        frames[frame.name] = frame
+
+    codes = []
+    frame = None
+    for _ in range(reader.int()):
+        op = strings[reader.int()]
+        fields = []
+        for _ in range(3):
+            tag = reader.byte()
+            if tag == FIELD_NONE:
+                fields.append(None)
+            elif tag == FIELD_INT:
+                fields.append(reader.int())
+            elif tag == FIELD_NAME:
+                fields.append(strings[reader.int()])
+            elif tag == FIELD_IMM:
+                fields.append(Imm(reader.int()))
+            elif tag == FIELD_STR:
+                fields.append(StrConst(reader.int()))
+            elif tag == FIELD_CALL:
+                fields.append(CallResult(strings[reader.int()]))
+            elif tag == FIELD_PARAM:
+                fields.append(frame.params[reader.int()])
+            else:
+                fields.append(frame.symbols[reader.int()])
+        if op == 'func':
+            frame = frames[fields[2]]
+        codes.append(MCode(op, *fields))
+    return codes, {'constant_table': constant_table, 'symbol_table': frames}
+
+
+def _put_int(buf, value):
+    value = (value << 1) ^ (value >> 63)  # zigzag，使绝对值小的负数也只占一个字节
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            buf.append(byte | 0x80)
+        else:
+            buf.append(byte)
+            return
+
+
+class _Reader(object):
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+
+    def byte(self):
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def bytes(self, size):
+        self.pos += size
+        return self.data[self.pos - size:self.pos]
+
+    def int(self):
+        result = shift = 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return (result >> 1) ^ -(result & 1)
@@ -0,0 +1,328 @@
+# ------------------------------------------------
+# bwcc: c_isel.py
+#
+# 指令选择：用 x86 的指令模式覆盖块内的表达式树，按代价表挑出最便宜的指令序列
+# ------------------------------------------------
+from c_fold import wrap
+from c_ir import Imm, TYPE_WIDTH, WORD_SIZE
+
+# 各指令的代价，大致为时钟周期数；每个读写内存的操作数另加 MEMORY_COST
+COSTS = {'movl': 1, 'leal': 1, 'addl': 1, 'subl': 1, 'incl': 1, 'decl': 1, 'sall': 1, 'imull': 3}
+MEMORY_COST = 1
+
+MNEMONIC = {'+': 'addl', '-': 'subl', '*': 'imull'}
+SCALES = (1, 2, 4, 8)  # leal 中变址寄存器的比例因子
+WINDOW = 16  # 向前查找可并入的四元式的范围
+
+
+def select_instructions(cfg, registers):
+    """ 为 cfg 中的 +、-、* 四元式选择指令。
+
+    Args:
+        registers: 寄存器分配的结果 {Symbol: 寄存器}
+    Returns:
+        {id(四元式): [(助记符, 操作数, ...)]}，操作数为寄存器、leal 的地址等
+        字符串，或由 CAssembler 转换为栈槽的 Symbol 和立即数 Imm。并入其他
+        四元式的对应空表，不在其中的四元式（如有 char 或函数返回值操作数）
+        仍按 CAssembler 的模板翻译。
+    """
+    return Selector(cfg, registers).tiles
+
+
+class Selector(object):
+    """ 自底向上的树覆盖。
+
+    块内只定值一次、只使用一次的临时变量，可以把它的定值并入使用处，组成
+    表达式树，在根处一起翻译。并入的四元式推迟到根处读取操作数，要求这期间
+    操作数所在的寄存器或栈槽没有被改写，见 _foldable()。
+
+    自后向前处理各个根，依次尝试并入最近的 0 到 n 个子树，对各个模式生成的
+    指令序列按 COSTS 计算代价，没有并入的子树按它单独翻译时的最小代价计算，
+    取总代价最小的一种。模式有：
+
+    - 二地址：先把一个操作数（叶子或子树）算到寄存器中，再与另一个叶子运算，
+      叶子可以是立即数或内存；结果与这个操作数在同一个寄存器中时省去复制，
+      CAssembler 原来的模板即是它的特例
+    - leal：a + b * 4 + c 这样的地址运算，乘数为 1、2、4、8（以及 3、5、9），
+      叶子中至多一个在内存中，先读入 %eax
+    - 三操作数的 imull $k, y, x
+    - 读-改-写：x 在内存中时 addl/subl/sall 直接作用于 x 的栈槽
+
+    ±1 用 incl/decl，乘以 2 的幂用 sall。
+    """
+
+    def __init__(self, cfg, registers):
+        self.registers = registers
+        self.tiles = {}
+        self.uses = {}
+        self.defs = {}
+        for block in cfg.blocks:
+            for code in block.codes:
+                for sym in code.uses():
+                    self.uses[sym] = self.uses.get(sym, 0) + 1
+                dest = code.dest()
+                if dest is not None:
+                    self.defs[dest] = self.defs.get(dest, 0) + 1
+        for block in cfg.blocks:
+            self._select_block(block.codes)
+
+    def _select_block(self, codes):
+        for i in range(len(codes) - 1, -1, -1):
+            code = codes[i]
+            if id(code) in self.tiles or not _selectable(code):
+                continue
+            run = self._foldable(codes, i)
+            singles = [self._best(codes[j], {})[0] for j in run]
+            best = None
+            for m in range(len(run) + 1):
+                folded = {codes[j].result: codes[j] for j in run[:m]}
+                cost, insns = self._best(code, folded)
+                if insns is None:
+                    continue
+                cost += sum(singles[m:])
+                if best is None or (cost, len(insns)) < best[:2]:
+                    best = (cost, len(insns), insns, m)
+            _, _, insns, m = best
+            self.tiles[id(code)] = insns
+            for j in run[:m]:
+                self.tiles[id(codes[j])] = []
+
+    def _foldable(self, codes, root):
+        """ 可以并入 root 的四元式的位置，从近到远。
+
+        并入的四元式推迟到 root 处才读取操作数，它和 root 之间其余的四元式
+        （只能是 +、-、*，翻译时除了 %eax 只改写自己的结果）的结果不能与这些
+        操作数在同一个寄存器或栈槽中。
+        """
+        run = []
+        needed = set(value for value in (codes[root].arg1, codes[root].arg2) if value.kind == 'temp')
+        written = set()  # 中间未并入的四元式写入的位置
+        for j in range(root - 1, max(root - WINDOW, 0) - 1, -1):
+            code = codes[j]
+            if not needed or not _selectable(code):
+                break
+            dest = code.result
+            if dest not in needed or self.uses[dest] != 1 or self.defs[dest] != 1 or \
+                    any(self._location(value) in written for value in (code.arg1, code.arg2)):
+                written.add(self._location(dest))
+                continue
+            run.append(j)
+            needed.discard(dest)
+            needed.update(value for value in (code.arg1, code.arg2) if value.kind == 'temp')
+        return run
+
+    def _location(self, value):
+        # 变量所在的寄存器或栈槽，复用栈槽的临时变量 offset 相同
+        if value in self.registers:
+            return self.registers[value]
+        if value.kind in ('local', 'temp'):
+            return value.offset
+        return value
+
+    def _best(self, code, folded):
+        """ 各模式中代价最小的指令序列，(代价, 指令)，都不适用时指令为 None。
+
+        结果在寄存器中时先尝试直接在这个寄存器上计算，再尝试在 %eax 中计算后
+        复制过去；代价相同时取排在前面的。
+        """
+        candidates = [] if folded else [self._read_modify_write(code)]
+        reg = self.registers.get(code.result)
+        if reg is not None:
+            insns = self._compute(code, folded, reg)
+            if insns is not None and self._safe(insns, reg):
+                candidates.append(insns)
+        insns = self._compute(code, folded, '%eax')
+        if insns is not None:
+            candidates.append(self._finish(insns, '%eax', code.result))
+        return self._cheapest(candidates)
+
+    def _cheapest(self, candidates):
+        best = (None, None)
+        for insns in candidates:
+            if insns is None:
+                continue
+            cost = self.cost(insns)
+            if best[1] is None or (cost, len(insns)) < (best[0], len(best[1])):
+                best = (cost, insns)
+        return best
+
+    def cost(self, insns):
+        total = 0
+        for insn in insns:
+            total += COSTS[insn[0]]
+            total += MEMORY_COST * sum(1 for operand in insn[1:] if self._in_memory(operand))
+        return total
+
+    def _in_memory(self, operand):
+        return not isinstance(operand, str) and operand.kind != 'imm' and operand not in self.registers
+
+    def _safe(self, insns, reg):
+        # 在 reg 上计算时，reg 被写入之后不能再读取原来放在 reg 中的叶子
+        written = False
+        for insn in insns:
+            for operand in insn[1:-1]:
+                if written and (reg in operand if isinstance(operand, str) else self.registers.get(operand) == reg):
+                    return False
+            written = written or insn[-1] == reg
+        return True
+
+    def _finish(self, insns, target, dest):
+        # 结果不在目标寄存器中时写回
+        if target != self.registers.get(dest):
+            insns = insns + [('movl', target, dest)]
+        return insns
+
+    def _into(self, value, folded, target):
+        """ 把叶子或并入的子树的值算到寄存器 target 中 """
+        if value in folded:
+            return self._compute(folded[value], folded, target)
+        if self._location(value) == target:
+            return []
+        return [('movl', value, target)]
+
+    def _compute(self, code, folded, target):
+        """ 在寄存器 target 中计算 code，代价最小的指令序列，不能计算时为 None。
+
+        可选的有：先算出一个操作数再与叶子运算（二地址的 addl、subl、imull，
+        以及 incl、decl、sall），leal，和三操作数的 imull。
+        """
+        candidates = []
+        orders = [(code.arg1, code.arg2)]
+        if code.op != '-':
+            orders.append((code.arg2, code.arg1))
+        for inner, leaf in orders:
+            if leaf in folded:
+                continue
+            head = self._into(inner, folded, target)
+            if head is not None:
+                candidates.append(head + [_operate(code.op, leaf, target)])
+        candidates += [self._lea(code, folded, target), self._imul3(code, folded, target)]
+        return self._cheapest(candidates)[1]
+
+    def _lea(self, code, folded, target):
+        address = _address(code, folded)
+        if address is None:
+            return None
+        terms, disp = address
+        if len(terms) == 1 and terms[0][1] == 1 and disp == 0:
+            return None  # 只是复制
+        insns = []
+        regs = {}
+        for sym, _ in terms:
+            if sym in regs:
+                continue
+            if sym in self.registers:
+                regs[sym] = self.registers[sym]
+            elif '%eax' in regs.values():
+                return None
+            else:
+                insns.append(('movl', sym, '%eax'))  # 至多一个叶子在内存中，借用 %eax
+                regs[sym] = '%eax'
+        if terms[0][1] == 1:
+            base, index = regs[terms[0][0]], terms[1:]
+        else:
+            base, index = '', terms
+        operand = '{}({}{})'.format(disp or '', base, ''.join(
+            ',{}'.format(regs[sym]) + (',{}'.format(scale) if scale != 1 else '') for sym, scale in index))
+        insns.append(('leal', operand, target))
+        return insns
+
+    def _imul3(self, code, folded, target):
+        if code.op != '*':
+            return None
+        arg1, arg2 = code.arg1, code.arg2
+        if arg1.kind == 'imm':
+            arg1, arg2 = arg2, arg1
+        if arg2.kind != 'imm' or arg1.kind == 'imm' or arg1 in folded:
+            return None
+        return [('imull', arg2, arg1, target)]
+
+    def _read_modify_write(self, code):
+        # x 在内存中时 x = x op y 直接改写 x 的栈槽
+        if code.result in self.registers:
+            return None
+        dest = self._location(code.result)
+        src = None
+        if code.arg1.kind != 'imm' and self._location(code.arg1) == dest:
+            src = code.arg2
+        elif code.op != '-' and code.arg2.kind != 'imm' and self._location(code.arg2) == dest:
+            src = code.arg1
+        if src is None or self._in_memory(src):
+            return None
+        if code.op == '*' and _shift(src) is None:
+            return None  # imull 不能写内存
+        return [_operate(code.op, src, code.result)]
+
+
+def _selectable(code):
+    # 只处理 int 运算；char 变量和函数返回值仍用 CAssembler 的模板
+    return code.op in MNEMONIC and all(_is_word(value) for value in (code.arg1, code.arg2, code.result))
+
+
+def _is_word(value):
+    if value.kind in ('local', 'temp'):
+        return TYPE_WIDTH[value.type] == WORD_SIZE
+    return value.kind in ('imm', 'param')
+
+
+def _shift(value):
+    """ value 为 2 的正整数次幂时返回指数 """
+    if value.kind == 'imm' and value.value > 1 and value.value & (value.value - 1) == 0:
+        return value.value.bit_length() - 1
+    return None
+
+
+def _operate(op, src, dest):
+    """ dest op= src 的一条指令 """
+    if op in ('+', '-') and src.kind == 'imm' and src.value in (1, -1):
+        return ('incl' if (src.value == 1) == (op == '+') else 'decl', dest)
+    if op == '*' and _shift(src) is not None:
+        return ('sall', Imm(_shift(src)), dest)
+    return (MNEMONIC[op], src, dest)
+
+
+def _address(code, folded):
+    """ 把以 code 为根的树化为 leal 的地址 ([(变量, 比例因子)], 位移)，不能表示时为 None """
+    terms, disp = _linear(code, folded)
+    if terms is None:
+        return None
+    merged = {}
+    for sym, scale in terms:
+        merged[sym] = merged.get(sym, 0) + scale
+    terms = [(sym, scale) for sym, scale in merged.items() if scale]
+    if len(terms) == 1 and terms[0][1] in (2, 3, 5, 9):
+        sym, scale = terms[0]
+        terms = [(sym, 1), (sym, scale - 1)]  # x * 5 = x + x * 4，x * 2 用 (x,x) 省去 4 字节的位移
+    if len(terms) == 2 and terms[0][1] != 1:
+        terms.reverse()
+    if not terms or len(terms) > 2 or any(scale not in SCALES for _, scale in terms):
+        return None
+    if len(terms) == 2 and terms[0][1] != 1:
+        return None
+    return terms, disp
+
+
+def _linear(code, folded):
+    # code 的值表示为各变量的倍数之和加常量
+    parts = []
+    for value in (code.arg1, code.arg2):
+        if value.kind == 'imm':
+            parts.append(([], value.value))
+        elif value in folded:
+            parts.append(_linear(folded[value], folded))
+        else:
+            parts.append(([(value, 1)], 0))
+        if parts[-1][0] is None:
+            return None, 0
+    (terms1, disp1), (terms2, disp2) = parts
+    if code.op == '+':
+        return terms1 + terms2, wrap(disp1 + disp2)
+    if code.op == '-':
+        if terms2:
+            return None, 0
+        return terms1, wrap(disp1 - disp2)
+    if terms1:
+        (terms1, disp1), (terms2, disp2) = (terms2, disp2), (terms1, disp1)
+    if terms1:
+        return None, 0  # 两个变量相乘
+    return [(sym, scale * disp1) for sym, scale in terms2], wrap(disp2 * disp1)
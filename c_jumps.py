@@ -0,0 +1,141 @@
+# ------------------------------------------------
+# bwcc: c_jumps.py
+#
+# 跳转优化：串接跳转链，删去跳到下一块的跳转，合并顺序执行的块，删去无用的标号
+# ------------------------------------------------
+from c_cfg import is_jump
+from c_dce import remove_unreachable
+
+INVERSE = {'j>': 'j<=', 'j<': 'j>=', 'j==': 'j!=', 'j>=': 'j<', 'j<=': 'j>', 'j!=': 'j=='}
+
+
+def count_branches(codes):
+    """ 跳转四元式的条数，每条对应一条 jmp 或 jcc 指令 """
+    return sum(1 for code in codes if is_jump(code))
+
+
+def clean_jumps(cfg, frame):
+    """ 化简 visit_If、visit_While 等生成的跳转和标号，反复进行直到没有变化：
+
+    1. 目标块只有一条 j 的跳转直接跳到最终目标；
+    2. jcond L1; j L2; L1: 改为 jnotcond L2; L1:；
+    3. 跳到紧接着的下一块的 j 和 jcond 删去；
+    4. 以 j 结尾、后继只有这一个前驱的块搬到跳转之后，删去这条 j；
+    5. 删去不可达的块和没有跳转引用的标号，顺序相连的块随之合并。
+
+    只用于非 SSA 形式，改动跳转时不需要维护 phi。
+
+    Returns:
+        删去的四元式条数
+    """
+    before = sum(len(block.codes) for block in cfg.blocks)
+    while True:
+        changed = _thread(cfg)
+        changed = _invert(cfg) or changed
+        changed = _fallthrough(cfg) or changed
+        changed = _move_blocks(cfg) or changed
+        changed = remove_unreachable(cfg) > 0 or changed
+        changed = _drop_labels(cfg) or changed
+        if not changed:
+            break
+    return before - sum(len(block.codes) for block in cfg.blocks)
+
+
+def _labels(cfg):
+    return {block.label: block for block in cfg.blocks if block.label is not None}
+
+
+def _only_jump(block):
+    """ 块中除标号外只有一条 j 时返回它 """
+    codes = block.codes[1:] if block.label is not None else block.codes
+    if len(codes) == 1 and codes[0].op == 'j':
+        return codes[0]
+    return None
+
+
+def _thread(cfg):
+    labels = _labels(cfg)
+    changed = False
+    for block in cfg.blocks:
+        last = block.codes[-1] if block.codes else None
+        if last is None or not is_jump(last):
+            continue
+        target = last.result
+        seen = {target}
+        jump = _only_jump(labels[target])
+        while jump is not None and jump.result not in seen:  # 死循环 L: j L 保持不变
+            target = jump.result
+            seen.add(target)
+            jump = _only_jump(labels[target])
+        if target != last.result:
+            last.result = target
+            changed = True
+    if changed:
+        cfg.link()
+    return changed
+
+
+def _invert(cfg):
+    blocks = cfg.blocks
+    labels = _labels(cfg)
+    changed = False
+    i = 0
+    while i + 2 < len(blocks):
+        block, middle, after = blocks[i:i + 3]
+        last = block.codes[-1] if block.codes else None
+        if last is not None and last.op in INVERSE and after.label == last.result and \
+                middle.label is None and _only_jump(middle) is not None:
+            last.op = INVERSE[last.op]
+            last.result = middle.codes[0].result
+            del blocks[i + 1]
+            changed = True
+        i += 1
+    if changed:
+        cfg.link()
+    return changed
+
+
+def _fallthrough(cfg):
+    blocks = cfg.blocks
+    changed = False
+    for block, after in zip(blocks, blocks[1:]):
+        last = block.codes[-1] if block.codes else None
+        if last is not None and is_jump(last) and last.result == after.label:
+            block.codes.pop()
+            changed = True
+    if changed:
+        cfg.link()
+    return changed
+
+
+def _move_blocks(cfg):
+    changed = False
+    labels = _labels(cfg)
+    for block in list(cfg.blocks):
+        last = block.codes[-1] if block.codes else None
+        if last is None or last.op != 'j':
+            continue
+        target = labels[last.result]
+        tail = target.codes[-1] if target.codes else None
+        # 目标块不会顺序执行到别处，也没有别的前驱，可以整块搬走
+        if target is block or target is cfg.entry or len(target.preds) != 1 or \
+                tail is None or tail.op not in ('j', 'return'):
+            continue
+        cfg.blocks.remove(target)
+        cfg.blocks.insert(cfg.blocks.index(block) + 1, target)
+        block.codes.pop()
+        cfg.link()
+        changed = True
+    return changed
+
+
+def _drop_labels(cfg):
+    used = {code.result for block in cfg.blocks for code in block.codes if is_jump(code)}
+    changed = False
+    for block in cfg.blocks:
+        if block.label is not None and block.label not in used:
+            del block.codes[0]
+            changed = True
+    if changed:
+        cfg.rebuild()
+    return changed
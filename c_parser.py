@@ -3,6 +3,7 @@
 #
 # CParser class: 语法分析，同时构造抽象语法树
 # ------------------------------------------------
+import sys
 from ply import yacc
 import c_ast
 from c_lexer import CLexer
@@ -16,10 +17,17 @@ class CParser(BaseParser):
     翻译单元的列表。
 
     Attributes:
+        intern_leaves: 是否按值共享 IdentifierType 和 Constant 叶子结点
 
     """
-    def __init__(self, lex_optimize=False, yacc_optimize=False):
+    def __init__(self, lex_optimize=False, yacc_optimize=False,
+                 intern_leaves=True):
         """ 创建 CParser 对象并初始化。
+
+        Args:
+            intern_leaves: 为 True 时，值相同的 IdentifierType、Constant 结点
+                以及它们持有的 names 列表在同一次 parse() 中只创建一次。
+                需要原地修改这些结点的使用者应传入 False。
         """
         self.clex = CLexer(
             error_func = self._lex_error_func,
@@ -59,10 +67,16 @@ class CParser(BaseParser):
         # _scope_stack[-1] 表示当前所在的范围
         self._scope_stack = [dict()]
 
+        # 叶子结点的享元表 {(结点类名, 值...): 结点}
+        # 共享的结点保留第一次出现时的 coord
+        self.intern_leaves = intern_leaves
+        self._leaf_table = {}
+
     def parse(self, text, filename=''):
         """ 解析C语言代码并生成抽象语法树
         """
         self.clex.filename = filename
+        self._leaf_table = {}
         return self.cparser.parse(input=text, lexer=self.clex)
 
     #################### PRIVATE ####################
@@ -120,6 +134,31 @@ class CParser(BaseParser):
     def _get_lookahead_token(self):
         return self.clex.last_token
 
+    def _identifier_type(self, names, coord):
+        """ 构造 IdentifierType 结点，开启 intern_leaves 时按 names 共享。
+        """
+        if not self.intern_leaves:
+            return c_ast.IdentifierType(names, coord=coord)
+        names = [sys.intern(name) for name in names]
+        key = ('IdentifierType',) + tuple(names)
+        node = self._leaf_table.get(key)
+        if node is None:
+            node = c_ast.IdentifierType(names, coord=coord)
+            self._leaf_table[key] = node
+        return node
+
+    def _constant(self, type, value, coord):
+        """ 构造 Constant 结点，开启 intern_leaves 时按 (type, value) 共享。
+        """
+        if not self.intern_leaves:
+            return c_ast.Constant(type, value, coord)
+        key = ('Constant', type, value)
+        node = self._leaf_table.get(key)
+        if node is None:
+            node = c_ast.Constant(sys.intern(type), sys.intern(value), coord)
+            self._leaf_table[key] = node
+        return node
+
     def _type_modify_decl(self, decl, modifier):
         """ 修改 declaration 的修饰符。
 
@@ -197,13 +236,13 @@ class CParser(BaseParser):
             # 函数声明可以不写 type，缺省值为 int
             # 
             if isinstance(decl.type, c_ast.FuncDecl):
-                type.type = c_ast.IdentifierType(['int'], coord=decl.coord)
+                type.type = self._identifier_type(['int'], coord=decl.coord)
             else:
                 self._parse_error('声明中缺少类型', decl.coord)
         else:
             # 将多个类型名合并成一个 IdentifierType 结点
             # 
-            type.type = c_ast.IdentifierType(
+            type.type = self._identifier_type(
                 [name for id in typename for name in id.names],
                 coord=typename[0].coord
             )
@@ -651,7 +690,7 @@ class CParser(BaseParser):
         # 形参缺省类型为 int
         # 
         if not spec['type']:
-            spec['type'] = [c_ast.IdentifierType(['int'], 
+            spec['type'] = [self._identifier_type(['int'],
                            coord=self._token_coord(p, 1))]
         
         # _build_declarations() 函数返回一个 list
@@ -746,7 +785,7 @@ class CParser(BaseParser):
                                         | UNSIGNED
                                         | TYPEID
         """
-        p[0] = c_ast.IdentifierType([p[1]], coord=self._token_coord(p, 1))
+        p[0] = self._identifier_type([p[1]], coord=self._token_coord(p, 1))
 
 
     ###### enum 部分 ######
@@ -1135,7 +1174,7 @@ class CParser(BaseParser):
         elif lCount > 2:
             raise ValueError('常量尾缀错误，含有多余2个l/L')
         prefix = 'unsigned ' * uCount + 'long ' * lCount
-        p[0] = c_ast.Constant(prefix + 'int', p[1], self._token_coord(p, 1))
+        p[0] = self._constant(prefix + 'int', p[1], self._token_coord(p, 1))
 
     def p_constant_2(self, p):
         """ constant : FLOAT_CONST """
@@ -1145,17 +1184,17 @@ class CParser(BaseParser):
             t = 'long double'
         else:
             t = 'double'
-        p[0] = c_ast.Constant(t, p[1], self._token_coord(p, 1))
+        p[0] = self._constant(t, p[1], self._token_coord(p, 1))
 
     def p_constant_3(self, p):
         """ constant : CHAR_CONST """
-        p[0] = c_ast.Constant('char', p[1], self._token_coord(p, 1))
+        p[0] = self._constant('char', p[1], self._token_coord(p, 1))
 
     # 字符串
     #
     def p_string_literal(self, p):
         """ string_literal : STRING_LITERAL """
-        p[0] = c_ast.Constant(
+        p[0] = self._constant(
             'string', p[1].replace('\n', '\\n'), self._token_coord(p, 1))
 
     def p_brace_open(self, p):
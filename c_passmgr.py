@@ -0,0 +1,156 @@
+# ------------------------------------------------
+# bwcc: c_passmgr.py
+#
+# PassManager class: 在 CTranslator 和 CAssembler 之间按优化级别依次运行各遍优化
+# ------------------------------------------------
+import time
+
+from c_cfg import build_cfgs, join_functions
+from c_copyprop import propagate_copies, coalesce_copies
+from c_cse import local_cse
+from c_dce import eliminate_dead_code
+from c_fold import fold_constants
+from c_jumps import clean_jumps
+from c_reassoc import reassociate
+from c_sccp import sccp
+from c_ssa import to_ssa, value_numbering, from_ssa
+from c_verify import IRError, verify
+
+
+class Pass(object):
+    """ 一遍优化，对每个函数调用一次 run(cfg, frame)
+
+    Attributes:
+        name: 名字，用于 PIPELINES 和统计输出
+        run: 优化函数，可以原地修改 cfg 和 frame
+        ssa: 要求输入为 SSA 形式时为 True，要求非 SSA 形式时为 False，都可以为 None
+        produces: 输出为 SSA 形式时为 True，非 SSA 形式时为 False，与输入相同为 None
+    """
+    __slots__ = ('name', 'run', 'ssa', 'produces')
+
+    def __init__(self, name, run, ssa=None, produces=None):
+        self.name = name
+        self.run = run
+        self.ssa = ssa
+        self.produces = produces
+
+
+PASSES = {}
+
+
+def register(name, run, ssa=None, produces=None):
+    PASSES[name] = Pass(name, run, ssa, produces)
+
+
+register('reassoc', reassociate)
+register('fold', fold_constants)
+register('cse', local_cse)
+register('copyprop', propagate_copies)
+register('coalesce', coalesce_copies, ssa=False)
+register('dce', eliminate_dead_code)
+register('jumps', clean_jumps, ssa=False)
+register('ssa', to_ssa, ssa=False, produces=True)
+register('sccp', sccp, ssa=True)
+register('gvn', value_numbering, ssa=True)
+register('out-of-ssa', from_ssa, ssa=True, produces=False)
+
+# 各优化级别的默认流水线
+PIPELINES = {
+    0: [],
+    1: ['reassoc', 'fold', 'cse', 'copyprop', 'dce', 'coalesce', 'jumps'],
+    2: ['reassoc', 'fold', 'ssa', 'sccp', 'gvn', 'dce', 'out-of-ssa',
+        'fold', 'copyprop', 'dce', 'coalesce', 'jumps'],
+}
+
+
+class PassStat(object):
+    """ 一遍优化在所有函数上的累计耗时和四元式条数变化 """
+    __slots__ = ('name', 'seconds', 'before', 'after')
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.before = 0
+        self.after = 0
+
+
+class PassManager(object):
+    """ 按顺序对每个函数运行一串优化。
+
+    四元式先按函数切分并建立控制流图，依次运行各遍，最后重新拼接。各遍可能
+    在栈帧中增删变量，必须在 CTranslator.get_tables() 计算栈帧布局之前运行。
+
+    Args:
+        pipeline: 优化级别（整数）或者 PASSES 中的名字列表
+        verify: 每遍之后都校验中间代码，出错时抛出 c_verify.IRError
+    """
+
+    def __init__(self, pipeline=0, verify=False):
+        if isinstance(pipeline, int):
+            pipeline = PIPELINES[pipeline]
+        self.passes = [PASSES[name] for name in pipeline]
+        self.verify = verify
+        self.stats = [PassStat(p.name) for p in self.passes]
+        self._check_forms()
+
+    def _check_forms(self):
+        ssa = False
+        for p in self.passes:
+            if p.ssa is not None and p.ssa != ssa:
+                raise ValueError('{} 要求{} SSA 形式的输入'.format(p.name, '' if p.ssa else '非'))
+            if p.produces is not None:
+                ssa = p.produces
+        if ssa:
+            raise ValueError('流水线结束时仍是 SSA 形式，需要 out-of-ssa')
+
+    def run(self, codes, frames):
+        """ 优化整个程序的四元式
+
+        Args:
+            codes: CTranslator.get_codes() 的结果
+            frames: {函数名: Frame}，即 CTranslator.symbol_table
+
+        Returns:
+            优化后的四元式列表
+        """
+        cfgs = build_cfgs(codes)
+        if not self.passes:
+            return join_functions(cfgs)
+        if self.verify:
+            self._verify(cfgs, frames, False, 'translator')
+        ssa = False
+        for p, stat in zip(self.passes, self.stats):
+            for cfg in cfgs:
+                frame = frames[cfg.name]
+                stat.before += _size(cfg)
+                start = time.perf_counter()
+                p.run(cfg, frame)
+                stat.seconds += time.perf_counter() - start
+                stat.after += _size(cfg)
+            if p.produces is not None:
+                ssa = p.produces
+            if self.verify:
+                self._verify(cfgs, frames, ssa, p.name)
+        # 优化之后不再使用的变量不占栈帧空间
+        for cfg in cfgs:
+            frames[cfg.name].drop_unused(cfg.symbols())
+        return join_functions(cfgs)
+
+    def _verify(self, cfgs, frames, ssa, name):
+        for cfg in cfgs:
+            try:
+                verify(cfg, frames[cfg.name], ssa)
+            except IRError as e:
+                raise IRError('{} 之后，{}'.format(name, e))
+
+    def report(self):
+        """ 各遍的耗时和四元式条数变化，每遍一行 """
+        lines = ['{:<14}{:>10}{:>8}{:>8}{:>8}'.format('pass', 'ms', 'before', 'after', 'delta')]
+        for stat in self.stats:
+            lines.append('{:<14}{:>10.3f}{:>8}{:>8}{:>+8}'.format(
+                stat.name, stat.seconds * 1000, stat.before, stat.after, stat.after - stat.before))
+        return '\n'.join(lines)
+
+
+def _size(cfg):
+    return sum(len(block.codes) for block in cfg.blocks)
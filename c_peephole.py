@@ -0,0 +1,161 @@
+# ------------------------------------------------
+# bwcc: c_peephole.py
+#
+# 机器指令记录和窥孔优化：CAssembler 先生成 Insn 的列表，按规则表改写后再输出文本
+# ------------------------------------------------
+
+REGISTERS = ('%eax', '%ebx', '%ecx', '%edx', '%esi', '%edi', '%ebp', '%esp')
+
+# 条件跳转的相反条件
+INVERSE = {'jg': 'jle', 'jle': 'jg', 'jl': 'jge', 'jge': 'jl', 'je': 'jne', 'jne': 'je'}
+
+
+class Insn(object):
+    """ 一行汇编：机器指令、伪指令或标号
+
+    Attributes:
+        op: 助记符，如 'movl'；伪指令以 . 开头，如 '.cfi_offset'；标号为 'label'
+        args: 操作数字符串，按 AT&T 的顺序源操作数在前；标号为 (标号名,)
+    """
+    __slots__ = ('op', 'args')
+
+    def __init__(self, op, *args):
+        self.op = op
+        self.args = args
+
+    def __repr__(self):
+        return render(self.op, self.args)
+
+    def __str__(self):
+        return self.__repr__()
+
+    def is_jump(self):
+        return self.op[0] == 'j'
+
+
+def render(op, args):
+    """ 一行汇编的文本，不带换行 """
+    if op == 'label':
+        return '{}:'.format(args[0])
+    if not args:
+        return '\t' + op
+    return '\t{}\t{}'.format(op, ', '.join(args))
+
+
+def _is_reg(operand):
+    return operand in REGISTERS
+
+
+def _is_move(insn):
+    return insn.op == 'movl'
+
+
+# ---------------- 规则 ----------------
+# 每条规则读取相邻的几条记录，可以改写时返回替换它们的列表，否则返回 None。
+# 只看相邻的记录，中间有标号时不会匹配，不用担心从别处跳入。
+
+
+def store_load(a, b):
+    """ movl X, Y; movl Y, X 中第二条是多余的，如写回临时变量后又读出。
+
+    X 是以 Y 为基址的内存操作数时，第一条改变了 X 所指的位置，不能删去。
+    """
+    if _is_move(a) and _is_move(b) and a.args[0] == b.args[1] and a.args[1] == b.args[0] and \
+            a.args[1] not in a.args[0]:
+        return [a]
+    return None
+
+
+def forward_store(a, b):
+    """ movl R, M; movl M, S 中的读取改为寄存器之间的 movl R, S """
+    if _is_move(a) and _is_move(b) and _is_reg(a.args[0]) and not _is_reg(a.args[1]) and \
+            b.args[0] == a.args[1] and _is_reg(b.args[1]) and b.args[1] != a.args[0]:
+        return [a, Insn('movl', a.args[0], b.args[1])]
+    return None
+
+
+def self_move(a):
+    """ movl X, X """
+    if _is_move(a) and a.args[0] == a.args[1]:
+        return []
+    return None
+
+
+def dead_move(a, b):
+    """ movl X, Y; movl Z, Y 中 Z 不读 Y 时，第一条写入的值没有用到 """
+    if _is_move(a) and _is_move(b) and a.args[1] == b.args[1] and a.args[1] not in b.args[0]:
+        return [b]
+    return None
+
+
+def zero_register(a, b):
+    """ movl $0, R 改为较短的 xorl R, R。
+
+    xorl 改写标志位，后面紧跟条件跳转时不改；本汇编器中比较指令之后总是紧跟
+    条件跳转，两者之间不会有 movl。
+    """
+    if _is_move(a) and a.args[0] == '$0' and _is_reg(a.args[1]) and not (b.is_jump() and b.op != 'jmp'):
+        return [Insn('xorl', a.args[1], a.args[1]), b]
+    return None
+
+
+def compare_zero(a):
+    """ cmpl $0, R 改为 testl R, R，两者设置的标志位对有符号比较相同 """
+    if a.op == 'cmpl' and a.args[0] == '$0' and _is_reg(a.args[1]):
+        return [Insn('testl', a.args[1], a.args[1])]
+    return None
+
+
+def jump_to_next(a, b):
+    """ 跳转到紧接着的标号 """
+    if a.is_jump() and b.op == 'label' and a.args[0] == b.args[0]:
+        return [b]
+    return None
+
+
+def jump_over_jump(a, b, c):
+    """ jl L1; jmp L2; L1: 改为 jge L2; L1: """
+    if a.op in INVERSE and b.op == 'jmp' and c.op == 'label' and a.args[0] == c.args[0]:
+        return [Insn(INVERSE[a.op], b.args[0]), c]
+    return None
+
+
+# (窗口大小, 规则)，依次尝试
+RULES = [
+    (1, self_move),
+    (2, store_load),
+    (2, forward_store),
+    (2, dead_move),
+    (2, jump_to_next),
+    (3, jump_over_jump),
+    (1, compare_zero),
+    (2, zero_register),
+]
+WINDOW = max(size for size, _ in RULES)
+
+
+def optimize(insns, rules=RULES):
+    """ 从前向后滑动窗口应用规则，改写之后退回窗口大小的距离重新匹配，直到都不能改写。
+
+    每条规则都会减少指令条数或把指令换成不再匹配的形式，因而一定会停止。
+
+    Returns:
+        (改写后的列表, 各规则改写的次数 {规则名: 次数})
+    """
+    insns = list(insns)
+    counts = {}
+    i = 0
+    while i < len(insns):
+        for size, rule in rules:
+            window = insns[i:i + size]
+            if len(window) < size:
+                continue
+            replacement = rule(*window)
+            if replacement is not None:
+                insns[i:i + size] = replacement
+                counts[rule.__name__] = counts.get(rule.__name__, 0) + 1
+                i = max(i - WINDOW + 1, 0)
+                break
+        else:
+            i += 1
+    return insns, counts
@@ -0,0 +1,234 @@
+# ------------------------------------------------
+# bwcc: c_reassoc.py
+#
+# 重结合：把 a+b+c+d 这样的左深运算链按叶子的高度重建为较矮的树，并把链中的常量合并为一个
+# ------------------------------------------------
+import heapq
+
+from c_fold import wrap
+from c_ir import MCode, Imm
+from c_regalloc import REGISTERS
+
+ASSOCIATIVE = ('+', '*')
+IDENTITY = {'+': 0, '*': 1}
+
+
+def reassociate(cfg, frame):
+    """ 对块内 + 和 * 的运算链做重结合。
+
+    链的内部结点是只使用一次、且只被同一块内同一运算使用的临时变量，
+    x - 常量 看作 x + (-常量)。链的叶子中的常量先合并为一个，再按各叶子在
+    块内的高度（算出它的依赖链长度）像 Huffman 编码那样每次合并最低的两个，
+    a+b+c+d 的依赖链由 3 步缩短为 2 步，而 s = s + ... 中较晚算出的 s 最后
+    才参与运算，不会拉长跨语句的依赖链；常量在最后一步作立即数。int 的加法和乘法按 2^32 取模，满足
+    结合律和交换律，重结合不会改变回绕的结果。
+
+    新的四元式复用链中原有的临时变量，每一步放在它的叶子原来被读取的最后一个
+    结点处，先算出的叶子尽早合并，不都留到根处同时占用寄存器；重建后同时活跃
+    的临时变量仍多于可分配的寄存器时不做改动。叶子中有函数返回值，或叶子在
+    链的中途被重新赋值时也不做改动。
+
+    Returns:
+        改写的运算链条数
+    """
+    uses = {}
+    defs = {}
+    for block in cfg.blocks:
+        for code in block.codes:
+            for sym in code.uses():
+                uses[sym] = uses.get(sym, 0) + 1
+            dest = code.dest()
+            if dest is not None:
+                defs[dest] = defs.get(dest, 0) + 1
+
+    changed = 0
+    for block in cfg.blocks:
+        codes = block.codes
+        def_at = {}  # {临时变量: 块内定值它的链结点的位置}
+        use_at = {}  # {临时变量: 块内使用它的链结点的位置}
+        for i, code in enumerate(codes):
+            if _chain_op(code) is None:
+                continue
+            if code.result.kind == 'temp':
+                def_at[code.result] = i
+            for value in (code.arg1, code.arg2):
+                if value.kind == 'temp':
+                    use_at[value] = i
+
+        def inner(value, op):
+            # value 是否为链 op 的内部结点：只定值一次、只使用一次，且定值和使用都是块内的 op 结点
+            if value not in def_at or value not in use_at or uses[value] != 1 or defs[value] != 1:
+                return False
+            i, j = def_at[value], use_at[value]
+            return i < j and _chain_op(codes[i]) == op and _chain_op(codes[j]) == op
+
+        chains = {}  # {根的位置: (结点的位置, 叶子)}
+        removed = set()
+        for i in range(len(codes) - 1, -1, -1):
+            code = codes[i]
+            op = _chain_op(code)
+            if i in removed or op is None or inner(code.result, op):
+                continue
+            nodes, leaves = _collect(codes, i, op, inner, def_at)
+            if len(nodes) < 2 or not _movable(codes, i, leaves):
+                continue
+            chains[i] = (nodes, leaves)
+            removed.update(nodes[1:])
+        if not chains:
+            continue
+
+        # 按顺序重建，同时计算各变量的高度。链的各个结点原来的位置上留一个列表，
+        # 重建出的四元式放回其中，读取叶子不早于原来的位置
+        height = {}
+        result = []
+        slots = {}  # {链结点的位置: result 中的列表}
+        for i, code in enumerate(codes):
+            if i in removed or i in chains:
+                slots[i] = []
+                result.append(slots[i])
+            else:
+                _measure(code, height)
+                result.append(code)
+            if i not in chains:
+                continue
+            nodes, leaves = chains[i]
+            new = _rebuild(code.op if code.op != '-' else '+', leaves, height,
+                           [codes[j].result for j in nodes[1:]], code.result, i)
+            if new is None:
+                new = [(j, codes[j]) for j in sorted(nodes)]
+            else:
+                changed += 1
+            for j, new_code in new:
+                _measure(new_code, height)
+                slots[j].append(new_code)
+        block.codes = [code for item in result for code in (item if isinstance(item, list) else [item])]
+    return changed
+
+
+def _measure(code, height):
+    # 结果的高度：算出它的依赖链长度，拷贝不增加高度
+    dest = code.dest()
+    if dest is not None:
+        h = max([height.get(sym, 0) for sym in code.uses()] + [0])
+        height[dest] = h if code.op == '=' else h + 1
+
+
+def _chain_op(code):
+    """ code 作为运算链结点时的运算符，不是结点则为 None """
+    if code.op in ASSOCIATIVE:
+        return code.op
+    if code.op == '-' and isinstance(code.arg2, Imm):
+        return '+'
+    return None
+
+
+def _operands(code):
+    if code.op == '-':
+        return [code.arg1, Imm(wrap(-code.arg2.value))]
+    return [code.arg1, code.arg2]
+
+
+def _collect(codes, root, op, inner, def_at):
+    """ 从根出发收集链的结点和叶子。
+
+    Returns:
+        (结点的位置，根在最前), [(叶子, 读取它的结点的位置)]，叶子保持原来从左到右的顺序
+    """
+    nodes = []
+    leaves = []
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, int):
+            nodes.append(item)
+            for value in reversed(_operands(codes[item])):
+                stack.append(def_at[value] if inner(value, op) else (value, item))
+        else:
+            leaves.append(item)
+    return nodes, leaves
+
+
+def _movable(codes, root, leaves):
+    """ 叶子能否推迟到根处读取：不是函数返回值，读取之后到根之前没有被重新赋值 """
+    for leaf, i in leaves:
+        if leaf.kind == 'call':
+            return False
+        if leaf.kind != 'imm' and any(code.dest() is leaf for code in codes[i + 1:root]):
+            return False
+    return True
+
+
+def _rebuild(op, leaves, height, temps, dest, root):
+    """ 按高度合并叶子，结果在根的位置 root 写入 dest。
+
+    Args:
+        leaves: [(叶子, 原来读取它的结点的位置)]
+    Returns:
+        [(放置的位置, 四元式)]，每一步放在它的叶子原来被读取的最后一个位置上，
+        不把先算出的叶子都留到根处，以免同时活跃的变量超出寄存器的个数。
+        叶子之中只有一个常量，且原来就在最后时与原来的形状相同，返回 None。
+    """
+    constants = [leaf.value for leaf, _ in leaves if isinstance(leaf, Imm)]
+    terms = [(leaf, pos) for leaf, pos in leaves if not isinstance(leaf, Imm)]
+    if len(constants) < 2 and len(terms) < 3 and (not constants or isinstance(leaves[-1][0], Imm)):
+        return None
+    constant = IDENTITY[op]
+    for value in constants:
+        constant = wrap(constant + value if op == '+' else constant * value)
+    if not terms:
+        return [(root, MCode('=', Imm(constant), None, dest))]
+
+    # (高度, 序号, 操作数)，高度相同时保持原来从左到右的顺序。常量尽量留到最后一步，
+    # 只有常量不同的几条链仍然能被 cse 共用其余的部分；但最后一步的两个操作数中
+    # 一个先算出时（如 s = s + ... 中的 s 很晚才算出），先把常量合并到它上面，
+    # 不增加依赖链的长度。
+    # 高度相同时先合并较早读取的叶子，使每一步尽早放下，之后保持原来从左到右的顺序
+    heap = [(height.get(term, 0), pos, n, term) for n, (term, pos) in enumerate(terms)]
+    heapq.heapify(heap)
+    last = None if constant == IDENTITY[op] else Imm(constant)
+    temps = list(temps)
+    codes = []
+    serial = len(terms)
+    while len(heap) > 1:
+        h1, p1, _, a = heapq.heappop(heap)
+        h2, p2, _, b = heapq.heappop(heap)
+        if last is not None and not heap and h1 < h2:
+            target = temps.pop()
+            codes.append((p1, MCode(op, a, last, target)))
+            a, h1, last = target, h1 + 1, None
+        final = not heap and last is None
+        target = dest if final else temps.pop()
+        pos = root if final else max(p1, p2)
+        codes.append((pos, MCode(op, a, b, target)))
+        serial += 1
+        heapq.heappush(heap, (max(h1, h2) + 1, pos, serial, target))
+    if heap[0][3] is not dest:  # 常量已经提前合并，或没有常量时，最后一步已写入 dest
+        codes.append((root, MCode(op if last else '=', heap[0][3], last, dest)))
+    if _pressure(terms, codes) > len(REGISTERS):
+        return None
+    return codes
+
+
+def _pressure(terms, codes):
+    """ 重建后链中同时活跃的临时变量的最大个数。
+
+    按放置的位置依次执行各步：临时变量的叶子从原来读取它的位置起活跃，
+    中间结果从算出它的一步起活跃，都到读取它的一步为止。超过可分配的寄存器
+    个数时保持原来左深的形状，否则较宽的树会溢出到栈上，抵消重结合和
+    Sethi-Ullman 排序的好处。
+    """
+    order = sorted(range(len(codes)), key=lambda k: codes[k][0])  # 稳定排序，同一位置保持生成的顺序
+    start = {term: pos for term, pos in terms if term.kind == 'temp'}
+    end = {}  # {变量: 读取它的一步在 order 中的序号}
+    for n, k in enumerate(order):
+        for value in (codes[k][1].arg1, codes[k][1].arg2):
+            end[value] = n
+    peak = 0
+    made = set()
+    for n, k in enumerate(order):
+        pos, code = codes[k]
+        live = sum(1 for value, first in start.items() if first <= pos and end.get(value, -1) >= n) + \
+            sum(1 for value in made if end.get(value, -1) >= n)
+        peak = max(peak, live)
+        made.add(code.result)
+    return peak
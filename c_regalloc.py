@@ -0,0 +1,141 @@
+# ------------------------------------------------
+# bwcc: c_regalloc.py
+#
+# 线性扫描寄存器分配：给 CAssembler 中的局部变量和临时变量分配寄存器
+# ------------------------------------------------
+from c_dataflow import Liveness
+from c_ir import TYPE_WIDTH, WORD_SIZE
+
+# 可分配的寄存器，调用者保存的在前。%eax 存放运算结果和函数返回值，不参与分配。
+# 目标只有 32 位的 mingw，没有 64 位的寄存器组。
+REGISTERS = ('%ecx', '%edx', '%ebx', '%esi', '%edi')
+CALLEE_SAVED = ('%ebx', '%esi', '%edi')
+
+# 各寄存器的 DWARF 编号，用于 .cfi_offset
+DWARF_REGNO = {'%ecx': 1, '%edx': 2, '%ebx': 3, '%esi': 6, '%edi': 7}
+
+
+def clobbers(code):
+    """ CAssembler 翻译 code 时会改写的可分配寄存器。
+
+    在 code 处活跃（读取或跨越）的变量不能放在这些寄存器中；code 的结果
+    最后才写入，不受影响。
+    """
+    op = code.op
+    if op == 'call':
+        return ('%ecx', '%edx')
+    regs = ()
+    if op in ('/', '%'):
+        regs = ('%edx',)  # cltd 和 idivl
+        if code.arg2.kind in ('imm', 'call') or _is_byte(code.arg2):
+            regs += ('%ecx',)
+    elif op in ('+', '-', '*') or (op[0] == 'j' and op != 'j'):
+        if code.arg2.kind == 'call' or _is_byte(code.arg2):
+            regs = ('%ecx',)  # _get_rhs() 借用 %ecx
+    return regs
+
+
+def _is_byte(value):
+    return value.kind in ('local', 'temp') and TYPE_WIDTH[value.type] == 1
+
+
+def _allocatable(sym):
+    # 形参在调用者的栈帧中，char 变量在 %esi、%edi 中没有字节寄存器，都留在内存中
+    return sym.kind in ('local', 'temp') and TYPE_WIDTH[sym.type] == WORD_SIZE
+
+
+class Interval(object):
+    """ 变量的生存区间，用四元式在函数中的序号表示
+
+    Attributes:
+        sym: 变量
+        start, end: 第一个和最后一个活跃（或定值）的位置
+        weight: 溢出代价，每次读写计 10 ** 循环嵌套层数
+        forbidden: 区间内被改写、不能使用的寄存器
+        reg: 分配到的寄存器，溢出时为 None
+    """
+    __slots__ = ('sym', 'start', 'end', 'weight', 'forbidden', 'reg')
+
+    def __init__(self, sym, position):
+        self.sym = sym
+        self.start = self.end = position
+        self.weight = 0
+        self.forbidden = set()
+        self.reg = None
+
+
+def live_intervals(cfg):
+    """ 按四元式的排列顺序计算各变量的生存区间，按 start 排序。
+
+    每个变量只有一个区间，覆盖它第一次到最后一次活跃的位置，中间不活跃的
+    空洞也算在内。
+    """
+    cfg.compute_dominators()
+    liveness = Liveness(cfg)
+    intervals = {}
+    position = 0
+    for block in cfg.blocks:
+        steps = list(liveness.walk_backward(block))
+        steps.reverse()
+        weight = 10 ** block.loop_depth
+        for code, live_after in steps:
+            dest = code.dest()
+            live = live_after
+            if dest is not None:
+                live &= ~liveness.bit(dest)
+            uses = code.uses()
+            for sym in uses:
+                live |= liveness.bit(sym)
+            regs = clobbers(code)
+            touched = list(liveness.symbols(live | live_after))
+            if dest is not None:
+                touched.append(dest)
+            for sym in touched:
+                if not _allocatable(sym):
+                    continue
+                interval = intervals.get(sym)
+                if interval is None:
+                    interval = intervals[sym] = Interval(sym, position)
+                interval.end = position
+            for sym in liveness.symbols(live):
+                if sym in intervals and regs:
+                    intervals[sym].forbidden.update(regs)
+            for sym in uses + ([dest] if dest is not None else []):
+                if sym in intervals:
+                    intervals[sym].weight += weight
+            position += 1
+    return sorted(intervals.values(), key=lambda interval: interval.start)
+
+
+def allocate_registers(cfg):
+    """ Poletto-Sarkar 线性扫描。
+
+    按 start 依次处理区间，先释放已经结束的区间的寄存器，再从空闲且未被禁止
+    的寄存器中挑一个。没有可用的寄存器时，在占用了可用寄存器的区间和当前
+    区间中溢出 weight 最小的一个，循环中的变量因而优先留在寄存器中。
+
+    Returns:
+        {Symbol: 寄存器名}，溢出的变量不在其中，仍使用栈槽
+    """
+    intervals = live_intervals(cfg)
+    active = []
+    free = list(REGISTERS)
+    for current in intervals:
+        for interval in [interval for interval in active if interval.end <= current.start]:
+            active.remove(interval)
+            free.append(interval.reg)
+        candidates = [reg for reg in REGISTERS if reg in free and reg not in current.forbidden]
+        if candidates:
+            current.reg = candidates[0]
+            free.remove(current.reg)
+            active.append(current)
+            continue
+        victims = [interval for interval in active if interval.reg not in current.forbidden]
+        if not victims:
+            continue
+        victim = min(victims, key=lambda interval: interval.weight)
+        if victim.weight < current.weight:
+            current.reg, victim.reg = victim.reg, None
+            active.remove(victim)
+            active.append(current)
+    return {interval.sym: interval.reg for interval in intervals if interval.reg}
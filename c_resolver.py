@@ -0,0 +1,78 @@
+# ------------------------------------------------
+# bwcc: c_resolver.py
+#
+# CResolver class: 名字解析，将标识符绑定到栈帧中的变量
+# ------------------------------------------------
+import c_ast
+from c_ir import Frame
+
+
+class CResolver(c_ast.NodeVisitor):
+    """ 名字解析。
+
+    在翻译之前遍历一次 AST，按 C 语言的块作用域规则为每个函数建立 Frame，
+    并把每个 ID 和变量声明 Decl 绑定到对应的 Symbol，把 FuncDef 绑定到它的
+    Frame。之后的翻译和汇编都通过绑定直接拿到 Symbol，不再按名字查找。
+
+    Attributes:
+        bindings: {结点: Symbol 或 Frame}，结点以对象本身为键
+        frames: 按函数定义顺序排列的 Frame 列表
+    """
+
+    def __init__(self):
+        self.bindings = {}
+        self.frames = []
+        self.frame = None
+        self.scopes = []
+
+    def _lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        raise NameError('未定义的标识符 {}'.format(name))
+
+    def visit_FileAST(self, node):
+        for ext in node.ext:
+            if isinstance(ext, c_ast.FuncDef):
+                self.visit(ext)
+
+    def visit_FuncDef(self, node):
+        self.frame = Frame(node.decl.name)
+        self.frames.append(self.frame)
+        self.bindings[node] = self.frame
+        self.scopes = [{}]
+        args = node.decl.type.args
+        if args:
+            for param in args.params:
+                sym = self.frame.new_param(param.name, param.type.type.names[0])
+                self.bindings[param] = sym
+                self.scopes[-1][param.name] = sym
+        self.visit(node.body)
+        self.frame = None
+
+    def visit_Compound(self, node):
+        self.scopes.append({})
+        for item in node.block_items or []:
+            self.visit(item)
+        self.scopes.pop()
+
+    def visit_For(self, node):
+        self.scopes.append({})
+        self.generic_visit(node)
+        self.scopes.pop()
+
+    def visit_Decl(self, node):
+        if isinstance(node.type, c_ast.TypeDecl):
+            if node.init is not None:
+                self.visit(node.init)
+            sym = self.frame.new_local(node.name, node.type.type.names[0])
+            self.bindings[node] = sym
+            self.scopes[-1][node.name] = sym
+
+    def visit_FuncCall(self, node):
+        # 函数名不是变量，只解析实参
+        if node.args is not None:
+            self.visit(node.args)
+
+    def visit_ID(self, node):
+        self.bindings[node] = self._lookup(node.name)
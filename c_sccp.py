@@ -0,0 +1,173 @@
+# ------------------------------------------------
+# bwcc: c_sccp.py
+#
+# 稀疏条件常量传播（Wegman-Zadeck SCCP），在 SSA 形式上进行
+# ------------------------------------------------
+from c_fold import BRANCH_OPS, evaluate
+from c_ir import MCode, Imm, stored
+from c_ssa import promotable
+
+# 格的顶和底：TOP 为尚未确定，BOTTOM 为不是常量，其余为整数常量
+TOP = 'top'
+BOTTOM = 'bottom'
+
+
+def _meet(a, b):
+    if a is TOP:
+        return b
+    if b is TOP or a == b:
+        return a
+    return BOTTOM
+
+
+def sccp(cfg, frame):
+    """ 稀疏条件常量传播。
+
+    只沿可执行的边传播常量：一个块只有在某条入边被证明可执行后才会求值，
+    phi 也只对可执行的入边取交汇。这样在条件恒定的分支另一侧定值的变量不会
+    妨碍常量的判定，整个不会执行的 if 分支和条件恒为假的循环都能被删去。
+
+    存入 char 变量的常量按 char 截断后再参与传播。
+
+    结束后把常量变量的使用替换为立即数并删去其定值，条件恒定的跳转改为无条件
+    跳转或删去，不可达的块整个删去。
+
+    Returns:
+        删去和改写的四元式条数
+    """
+    variables = promotable(frame)
+    blocks = cfg.blocks
+    labels = {block.label: block for block in blocks if block.label is not None}
+    value = {}  # {SSA 变量: 格值}，缺省为 TOP
+    uses = {}  # {SSA 变量: [(基本块, 四元式)]}
+    defined = set()
+    for block in blocks:
+        for code in block.codes:
+            for sym in code.uses():
+                if sym in variables:
+                    uses.setdefault(sym, []).append((block, code))
+            dest = code.dest()
+            if dest in variables:
+                defined.add(dest)
+
+    def lattice(operand):
+        if isinstance(operand, Imm):
+            return operand.value
+        if operand in variables:
+            if operand in value:
+                return value[operand]
+            return TOP if operand in defined else BOTTOM  # 未初始化的变量不是常量
+        return BOTTOM  # 形参、函数返回值、字符串常量
+
+    executable = set()  # 可执行的边 (前驱, 后继)，入口的入边前驱为 None
+    reached = set()
+    flow = [(None, cfg.entry)]
+    ssa = []
+
+    def set_value(sym, new):
+        old = value.get(sym, TOP)
+        if new != old:
+            value[sym] = new
+            ssa.extend(uses.get(sym, ()))
+
+    def visit(block, code):
+        op = code.op
+        if op == 'phi':
+            new = TOP
+            for pred, arg in code.arg1.items():
+                if (pred, block) in executable:
+                    new = _meet(new, lattice(arg))
+            set_value(code.result, new)
+        elif op in BRANCH_OPS:
+            cond = _evaluate(BRANCH_OPS[op], lattice(code.arg1), lattice(code.arg2))
+            if cond is TOP:
+                return
+            target = labels[code.result]
+            fallthrough = blocks[block.index + 1] if block.index + 1 < len(blocks) else None
+            if cond is BOTTOM or cond:
+                flow.append((block, target))
+            if (cond is BOTTOM or not cond) and fallthrough is not None:
+                flow.append((block, fallthrough))
+        else:
+            dest = code.dest()
+            if dest not in variables:
+                return
+            if op == '=':
+                new = lattice(code.arg1)
+            else:
+                new = _evaluate(op, lattice(code.arg1), lattice(code.arg2))
+            set_value(dest, stored(new, dest) if isinstance(new, int) else new)
+
+    while flow or ssa:
+        if flow:
+            edge = flow.pop()
+            if edge in executable:
+                continue
+            executable.add(edge)
+            block = edge[1]
+            first = block not in reached
+            reached.add(block)
+            for code in block.codes:
+                if code.op == 'phi' or first:
+                    visit(block, code)
+            if first:
+                last = block.codes[-1] if block.codes else None
+                if last is None or last.op not in BRANCH_OPS:
+                    for succ in block.succs:
+                        flow.append((block, succ))
+        else:
+            block, code = ssa.pop()
+            if block in reached:
+                visit(block, code)
+
+    return _rewrite(cfg, variables, value, reached)
+
+
+def _evaluate(op, a, b):
+    if a is BOTTOM or b is BOTTOM:
+        return BOTTOM
+    if a is TOP or b is TOP:
+        return TOP
+    result = evaluate(op, a, b)
+    return BOTTOM if result is None else result
+
+
+def _constant(value, sym):
+    result = value.get(sym)
+    return result if isinstance(result, int) else None
+
+
+def _rewrite(cfg, variables, value, reached):
+    changed = 0
+    kept = []
+    for block in cfg.blocks:
+        if block not in reached:
+            changed += len(block.codes)
+            continue
+        codes = []
+        for code in block.codes:
+            dest = code.dest()
+            if dest in variables and _constant(value, dest) is not None:
+                changed += 1
+                continue
+            if code.op == 'phi':
+                for pred, arg in code.arg1.items():
+                    if arg in variables and _constant(value, arg) is not None:
+                        code.arg1[pred] = Imm(value[arg])
+            else:
+                for field in code.use_fields():
+                    arg = getattr(code, field)
+                    if arg in variables and _constant(value, arg) is not None:
+                        setattr(code, field, Imm(value[arg]))
+            if code.op in BRANCH_OPS and isinstance(code.arg1, Imm) and isinstance(code.arg2, Imm):
+                cond = evaluate(BRANCH_OPS[code.op], code.arg1.value, code.arg2.value)
+                changed += 1
+                if cond:
+                    codes.append(MCode('j', None, None, code.result))
+                continue
+            codes.append(code)
+        block.codes = codes
+        kept.append(block)
+    cfg.blocks = kept
+    cfg.link()
+    return changed
@@ -0,0 +1,235 @@
+# ------------------------------------------------
+# bwcc: c_ssa.py
+#
+# SSA 形式：构造（mem2reg）、基于支配树的全局值编号和退出 SSA
+# ------------------------------------------------
+from c_cfg import is_jump
+from c_dataflow import Liveness
+from c_ir import MCode, Imm, stored
+
+COMMUTATIVE = ('+', '*', '==', '!=')
+
+
+def promotable(frame):
+    """ 可以提升为 SSA 值的变量。
+
+    子集中没有取地址运算和指针，局部变量和临时变量都不会被别名访问；
+    形参位于调用者的栈帧中，仍按内存变量处理。
+    """
+    return set(frame.symbols)
+
+
+def _phis(block):
+    """ 块开头的 phi 四元式 """
+    for code in block.codes:
+        if code.op == 'phi':
+            yield code
+        elif code.op != 'label':
+            return
+
+
+def _insert_at_entry(block, codes):
+    """ 把 codes 插入到块开头的标号之后 """
+    start = 1 if block.label is not None else 0
+    block.codes[start:start] = codes
+
+
+def to_ssa(cfg, frame):
+    """ 把 cfg 原地转换为 SSA 形式。
+
+    在变量定值点的迭代支配边界上放置 phi，并用活跃变量分析剪枝，只在变量
+    活跃的块放置；再沿支配树先序重命名。每个版本都是 frame 中的一个新变量，
+    第一次定值之前就被读取的变量仍使用原来的 Symbol。不可达的块不做改动。
+    """
+    variables = promotable(frame)
+    frontiers = cfg.dominance_frontiers()
+    liveness = Liveness(cfg)
+
+    defsites = {}
+    for block in cfg.reverse_postorder():
+        for code in block.codes:
+            dest = code.dest()
+            if dest in variables:
+                defsites.setdefault(dest, set()).add(block)
+
+    origin = {}  # {phi 四元式: 原变量}
+    phis = {}
+    for var, sites in defsites.items():
+        bit = liveness.bit(var)
+        placed = set()
+        work = list(sites)
+        while work:
+            for df in frontiers[work.pop()]:
+                if df in placed:
+                    continue
+                placed.add(df)
+                if liveness.live_in[df.index] & bit:
+                    phi = MCode('phi', {pred: var for pred in df.preds}, None, var)
+                    origin[phi] = var
+                    phis.setdefault(df, []).append(phi)
+                if df not in sites:
+                    work.append(df)
+    for block, codes in phis.items():
+        _insert_at_entry(block, codes)
+
+    # 沿支配树重命名，stacks[var][-1] 为当前可见的版本
+    stacks = {var: [var] for var in variables}
+    versions = {}
+    children = cfg.dominator_tree()
+    stack = [(cfg.entry, None)]
+    while stack:
+        block, pushed = stack.pop()
+        if pushed is not None:  # 离开 block，恢复进入前的版本
+            for var in pushed:
+                stacks[var].pop()
+            continue
+        pushed = []
+        for code in block.codes:
+            if code.op != 'phi':
+                for field in code.use_fields():
+                    value = getattr(code, field)
+                    if value in variables:
+                        setattr(code, field, stacks[value][-1])
+            dest = code.dest()
+            if dest in variables:
+                versions[dest] = versions.get(dest, 0) + 1
+                version = frame.new_version(dest, '{}.{}'.format(dest.name, versions[dest]))
+                stacks[dest].append(version)
+                pushed.append(dest)
+                code.result = version
+        for succ in block.succs:
+            for phi in _phis(succ):
+                phi.arg1[block] = stacks[origin[phi]][-1]
+        stack.append((block, pushed))
+        stack.extend((child, None) for child in reversed(children[block]))
+
+
+def _value_key(value, variables):
+    """ 值编号中操作数的键，只有 SSA 变量和立即数参与编号 """
+    if isinstance(value, Imm):
+        return (0, value.value)
+    if value in variables:
+        return (1, value.slot)
+    return None
+
+
+def value_numbering(cfg, frame):
+    """ 基于支配树的全局值编号（SSA 形式上进行）。
+
+    沿支配树先序遍历，哈希表随支配树作用域进出：一个表达式若在支配它的块中
+    已经计算过，就删去它，之后的使用改为先前的结果。拷贝、立即数赋值和所有
+    操作数相同的 phi 也一并删去；截断为 char 的赋值保留，存入的立即数先截断。
+
+    Returns:
+        删去的四元式条数
+    """
+    variables = promotable(frame)
+    values = {}  # {SSA 变量: 与它相等的操作数}
+    table = {}
+    removed = 0
+
+    def number(value):
+        return values.get(value, value) if value in variables else value
+
+    children = cfg.dominator_tree()
+    stack = [(cfg.entry, None)]
+    while stack:
+        block, added = stack.pop()
+        if added is not None:
+            for key in added:
+                del table[key]
+            continue
+        added = []
+        codes = []
+        for code in block.codes:
+            dest = code.dest()
+            if code.op == 'phi':
+                args = [number(value) for value in code.arg1.values()]
+                keys = [_value_key(value, variables) for value in args]
+                if None not in keys and len(set(keys)) == 1:
+                    values[code.result] = args[0]
+                    removed += 1
+                    continue
+                key = ('phi', block) + tuple(keys) if None not in keys else None
+            else:
+                for field in code.use_fields():
+                    setattr(code, field, number(getattr(code, field)))
+                if dest not in variables:
+                    codes.append(code)
+                    continue
+                if code.op == '=':
+                    if code.narrows() and code.arg1.kind == 'imm':
+                        code.arg1 = Imm(stored(code.arg1.value, dest))
+                    if not code.narrows() and _value_key(code.arg1, variables) is not None:
+                        values[dest] = code.arg1
+                        removed += 1
+                        continue
+                    key = None
+                else:
+                    left = _value_key(code.arg1, variables)
+                    right = _value_key(code.arg2, variables)
+                    if left is None or right is None:
+                        key = None
+                    else:
+                        if code.op in COMMUTATIVE and right < left:
+                            left, right = right, left
+                        key = (code.op, left, right)
+            if key is not None:
+                if key in table:
+                    values[dest] = table[key]
+                    removed += 1
+                    continue
+                table[key] = dest
+                added.append(key)
+            codes.append(code)
+        block.codes = codes
+
+        for succ in block.succs:
+            for phi in _phis(succ):
+                phi.arg1[block] = number(phi.arg1[block])
+        stack.append((block, added))
+        stack.extend((child, None) for child in reversed(children[block]))
+    return removed
+
+
+def from_ssa(cfg, frame):
+    """ 退出 SSA 形式，使四元式可以交给 CAssembler。
+
+    每个 phi 使用一个新变量 v：各前驱在末尾的跳转之前对 v 赋值，块开头再由 v
+    赋给 phi 的结果。v 只在这两处出现，不会与其它变量冲突，不需要拆分关键边，
+    也不存在 lost copy 和 swap 问题，多出的拷贝留给之后的拷贝传播处理。
+    最后删去 frame 中已经不再使用的变量。
+    """
+    for block in cfg.blocks:
+        phis = list(_phis(block))
+        if not phis:
+            continue
+        copies = []
+        for phi in phis:
+            sym = phi.result
+            temp = frame.new_version(sym, sym.name + '.in')
+            for pred, value in phi.arg1.items():
+                if pred in block.preds:
+                    _append_copy(pred, MCode('=', value, None, temp), frame)
+            copies.append(MCode('=', temp, None, sym))
+        block.codes = [code for code in block.codes if code.op != 'phi']
+        _insert_at_entry(block, copies)
+
+    frame.drop_unused(cfg.symbols())
+
+
+def _append_copy(block, copy, frame):
+    """ 把拷贝放在块末尾的跳转之前 """
+    codes = block.codes
+    if not codes or not is_jump(codes[-1]):
+        codes.append(copy)
+        return
+    jump = codes[-1]
+    # 拷贝经过 %eax，条件跳转读取的函数返回值需要先保存起来
+    for field in jump.use_fields():
+        value = getattr(jump, field)
+        if value is not None and value.kind == 'call':
+            temp = frame.new_temp('T' + value.func, 'int')
+            codes.insert(-1, MCode('=', value, None, temp))
+            setattr(jump, field, temp)
+    codes.insert(-1, copy)
@@ -1,70 +1,113 @@
 import c_ast
-import math
+from c_ir import TYPE_WIDTH, WORD_SIZE, MCode, Imm, StrConst, CallResult
+from c_cfg import build_cfgs
+from c_frame import temp_slot_colors
 from c_parser import CParser
-
-TYPE_WIDTH = {'int': 4, 'char': 1}
-WORD_SIZE = 4
-
-
-class MCode(object):
-    """ 四元式类
-    (jnz, a, -, p)
-    """
-
-    def __init__(self, op, arg1, arg2, result):
-        self.op = op
-        self.arg1 = arg1
-        self.arg2 = arg2
-        self.result = result
-
-    def __repr__(self):
-        return '({}, {}, {}, {})'.format(self.op, self.arg1 if self.arg1 != None else '-',
-                                         self.arg2 if self.arg2 != None else '-',
-                                         self.result if self.result != None else '-')
-    def __str__(self):
-        return self.__repr__()
+from c_resolver import CResolver
+from utils import constant_value
 
 
 class CTranslator(object):
 
     def __init__(self):
         self.codes = []  # 四元式
-        self.symbol_table = {}  # 符号名表 {函数名：{symbols:{name: type}, stacksize:xx)}}
+        self.symbol_table = {}  # 符号名表 {函数名：Frame}
+        self.bindings = {}  # 名字解析的结果 {结点：Symbol 或 Frame}
         self.func_table = []
         self.constant_table = {}  # 常量表 {常量值：(所属函数， 序号)}
         self.constant_count = 0
         self.temp_count = 0
         self.label_count = 0
         self.cur_func = None
+        self.frame = None
+        self.needs = {}  # Sethi-Ullman 标号 {(结点, 是否为左操作数)：需要的寄存器数}
+        self.effects = {}  # {结点：子树中是否有副作用}
 
     def get_codes(self):
         for code in self.codes:
             yield code
 
-    def get_tables(self):
+    def get_tables(self, codes=None, share_slots=True, omit_frame_pointer=False):
         # 根据符号表的类型计算需要初始化的堆栈大小和各个变量的偏移量
-        symbols = {}
-        for func, table in self.symbol_table.items():
-            temp = {}
-            offset = stacksize = math.ceil(table['stacksize'] / 16) * 16  # stacksize是16的整数倍
-            for name, type in table['symbols'].items():
-                offset = offset - TYPE_WIDTH[type]
-                temp[name] = offset
-                offset = (offset // WORD_SIZE) * WORD_SIZE  # 字对齐
-            symbols[func] = {'symbols': temp, 'stacksize': stacksize}
-        return {'constant_table': self.constant_table, 'symbol_table': symbols}
+        # 偏移量直接写入各个 Symbol，四元式中引用的就是这些 Symbol
+        # codes 为优化之后的四元式，缺省为翻译的结果；生存期不相交的临时变量共用栈槽
+        for cfg in build_cfgs(self.codes if codes is None else codes):
+            colors = temp_slot_colors(cfg) if share_slots else None
+            self.symbol_table[cfg.name].layout(colors, omit_frame_pointer)
+        return {'constant_table': self.constant_table, 'symbol_table': self.symbol_table}
 
     def _newtemp(self, type='int'):
         # TODO: 似乎可以不用临时变量，eax本身就可以作为中间变量
         self.temp_count = self.temp_count + 1
-        name = 'T' + str(self.temp_count)
-        self.symbol_table[self.cur_func]['symbols'][name] = type
-        self.symbol_table[self.cur_func]['stacksize'] += TYPE_WIDTH[type]
-        return name
+        return self.frame.new_temp('T' + str(self.temp_count), type)
+
+    def _stable(self, value, *later):
+        """ 函数返回值只在下一次调用前有效，若之后求值的 later 中可能含有函数
+        调用，先把 value 复制到临时变量。
+        """
+        if isinstance(value, CallResult) and \
+                not all(isinstance(node, (c_ast.ID, c_ast.Constant)) for node in later):
+            temp = self._newtemp()
+            self._emit('=', value, None, temp)
+            return temp
+        return value
+
+    def _need(self, node, is_left=True):
+        """ 对 node 求值需要的寄存器数（Sethi-Ullman 标号）。
+
+        运算的右操作数可以直接是立即数或内存，变量和常量作右操作数时不需要寄存器；
+        函数调用的结果在 %eax 中，算作一个。
+        """
+        key = (node, is_left)
+        if key in self.needs:
+            return self.needs[key]
+        if isinstance(node, (c_ast.ID, c_ast.Constant)):
+            need = 1 if is_left else 0
+        elif isinstance(node, c_ast.BinaryOp):
+            left = self._need(node.left, True)
+            right = self._need(node.right, False)
+            need = left + 1 if left == right else max(left, right)
+        elif isinstance(node, c_ast.UnaryOp) and \
+                (node.op == '+' or node.op == '-' and isinstance(node.expr, c_ast.Constant)):
+            need = self._need(node.expr, is_left)  # 负的常量直接成为立即数
+        elif isinstance(node, c_ast.UnaryOp):
+            need = max(1, self._need(node.expr, True))
+        elif isinstance(node, c_ast.Assignment):
+            need = max(1, self._need(node.rvalue, True))
+        else:
+            need = 1
+        self.needs[key] = need
+        return need
+
+    def _has_side_effects(self, node):
+        """ node 中是否有函数调用、赋值或自增自减 """
+        if node not in self.effects:
+            if isinstance(node, (c_ast.FuncCall, c_ast.Assignment)):
+                effects = True
+            elif isinstance(node, c_ast.UnaryOp) and node.op not in ('+', '-'):
+                effects = True
+            else:
+                effects = any(self._has_side_effects(child) for _, child in node.children())
+            self.effects[node] = effects
+        return self.effects[node]
+
+    def _operands(self, left, right):
+        """ 对二元运算的两个操作数求值，返回 (左操作数, 右操作数)。
+
+        右子树需要的寄存器更多时先对右子树求值，同时活跃的临时变量更少；
+        两边都有副作用时保持从左到右的顺序，调用和输出的次序不变。
+        """
+        if self._need(right, False) > self._need(left, True) and \
+                not (self._has_side_effects(left) and self._has_side_effects(right)):
+            right_value = self._stable(self.visit(right), left)
+            return self.visit(left), right_value
+        left_value = self._stable(self.visit(left), right)
+        return left_value, self.visit(right)
 
     def _newlabel(self):
+        # 标号用整数表示，输出时加上前缀 L
         self.label_count = self.label_count + 1
-        return 'L' + str(self.label_count)
+        return self.label_count
 
     def _emit(self, op, arg1, arg2, result):
         self.codes.append(MCode(op, arg1, arg2, result))
@@ -81,7 +124,8 @@ class CTranslator(object):
             # TODO：解决对 cond 的自动分析
             cond = args[0]
             if cond.op in ('>', '<', '==', '>=', '<=', '!='):
-                self._emit('j' + cond.op, cond.left.name, cond.right.value, args[1])
+                left, right = self._operands(cond.left, cond.right)
+                self._emit('j' + cond.op, left, right, args[1])
                 self._emit('j', None, None, args[2])
             elif cond.op in ('&&', '||', '!', '&', '|', '~'):
                 # TODO
@@ -95,21 +139,25 @@ class CTranslator(object):
     def _emitlabel(self, label):
         self._emit('label', None, None, label)
 
-    def _enter_func(self, funcname):
-        self._emit('func', None, None, funcname)
-        self.cur_func = funcname
-        self.symbol_table[funcname] = {'symbols': {}, 'stacksize': 0}
-        self.offset = 0
+    def _enter_func(self, frame):
+        self._emit('func', None, None, frame.name)
+        self.cur_func = frame.name
+        self.frame = frame
+        self.symbol_table[frame.name] = frame
 
     def _exit_func(self):
         self._emit('endfunc', None, None, None)
         self.cur_func = None
+        self.frame = None
 
     def visit(self, node):
         method = 'visit_' + node.__class__.__name__
         return getattr(self, method)(node)
 
     def visit_FileAST(self, node):
+        resolver = CResolver()
+        resolver.visit(node)
+        self.bindings = resolver.bindings
         for ext in node.ext:
             if isinstance(ext, c_ast.FuncDef):
                 self.visit(ext)
@@ -122,34 +170,26 @@ class CTranslator(object):
 
     def visit_Decl(self, node):
         if isinstance(node.type, c_ast.TypeDecl):
-            typename = self.visit(node.type)
-            self.symbol_table[self.cur_func]['symbols'][node.name] = typename
-            self.symbol_table[self.cur_func]['stacksize'] += TYPE_WIDTH[typename]
             if node.init:
-                self._emit('=', self.visit(node.init), None, node.name)
-        elif isinstance(node.type, c_ast.FuncDecl):
-            self.visit(node.type)
-
-    def visit_TypeDecl(self, node):
-        return node.type.names[0]
+                self._emit('=', self.visit(node.init), None, self.bindings[node])
 
     def visit_FuncDef(self, node):
-        self._enter_func(node.decl.name)
-        self.visit(node.decl)
+        # 形参和局部变量已由 CResolver 加入栈帧
+        self._enter_func(self.bindings[node])
         self.visit(node.body)
         self._exit_func()
 
-    def visit_FuncDecl(self, node):
-        if node.args:
-            for param in node.args.params:
-                self.symbol_table[self.cur_func]['symbols'][param.name] = param.type.type.names[0]
-
     def visit_FuncCall(self, node):
-        for i, arg in enumerate(reversed(node.args.exprs)):
-            self._emit('param', i, self.visit(arg), len(node.args.exprs))  # result中保存参数的总个数
-            self.symbol_table[self.cur_func]['stacksize'] += WORD_SIZE
+        # 先对所有实参求值再依次传参，避免实参中的函数调用覆盖已经传好的参数
+        args = list(reversed(node.args.exprs)) if node.args else []
+        values = [self._stable(self.visit(arg), *args[i + 1:]) for i, arg in enumerate(args)]
+        # 至多剩下一个函数返回值，它在 %eax 中，需要在其它参数之前传递
+        order = sorted(range(len(values)), key=lambda i: not isinstance(values[i], CallResult))
+        for i in order:
+            self._emit('param', i, values[i], len(values))  # result中保存参数的总个数
+        self.frame.new_call(len(values))
         self._emit('call', None, None, node.name.name)
-        return '_' + node.name.name
+        return CallResult(node.name.name)
 
     def visit_Compound(self, node):
         for body in node.block_items:
@@ -219,13 +259,14 @@ class CTranslator(object):
         self._emitlabel(falselabel)
 
     def visit_Assignment(self, node):
-        left = node.lvalue.name
+        left = self.visit(node.lvalue)
         right = self.visit(node.rvalue)
         self._emit('=', right, None, left)
 
     def visit_BinaryOp(self, node):
         temp = self._newtemp()
-        self._emit(node.op, self.visit(node.left), self.visit(node.right), temp)
+        left, right = self._operands(node.left, node.right)
+        self._emit(node.op, left, right, temp)
         return temp
 
     def visit_UnaryOp(self, node):
@@ -234,16 +275,16 @@ class CTranslator(object):
             if node.op == '+':
                 return orign
             elif node.op == '-':
-                if orign.isdigit():
-                    return '-' + orign
+                if isinstance(orign, Imm):
+                    return Imm(-orign.value)
                 else:
                     temp = self._newtemp()
-                    self._emit(node.op, str(0), orign, temp)
+                    self._emit(node.op, Imm(0), orign, temp)
                     return temp
         else:  # ++、--等
             temp = self._newtemp()
             op = node.op[-1]
-            self._emit(op, orign, str(1), temp)
+            self._emit(op, orign, Imm(1), temp)
             self._emit('=', temp, None, orign)
             if node.op.startswith('p'):
                 return orign
@@ -251,17 +292,16 @@ class CTranslator(object):
                 return temp
 
     def visit_Constant(self, node):
-        # TODO: 加入对String的处理
         if node.type == 'string':
             s = node.value[1:-1]
             if s not in self.constant_table:
                 self.constant_table[s] = (self.cur_func, self.constant_count)
                 self.constant_count += 1
-            return 'LC' + str(self.constant_table[s][1])
-        return node.value
+            return StrConst(self.constant_table[s][1])
+        return Imm(constant_value(node))
 
     def visit_ID(self, node):
-        return node.name
+        return self.bindings[node]
 
     def visit_Return(self, node):
-        self._emit('return', None, None, self.visit(node.expr))
+        self._emit('return', None, None, self.visit(node.expr) if node.expr else None)
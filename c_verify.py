@@ -0,0 +1,138 @@
+# ------------------------------------------------
+# bwcc: c_verify.py
+#
+# 中间代码校验：检查各遍优化之后四元式是否仍满足 CAssembler 依赖的不变式
+# ------------------------------------------------
+from c_cfg import is_jump
+from c_dataflow import ReachingDefinitions
+from c_ir import Temp
+
+VALUE_OPS = ('=', '+', '-', '*', '/', '%', '>', '<', '==', '>=', '<=', '!=')
+KNOWN_OPS = set(VALUE_OPS) | {'param', 'call', 'return', 'label', 'j', 'phi'} | \
+            {'j' + cond for cond in ('>', '<', '==', '>=', '<=', '!=')}
+
+
+class IRError(Exception):
+    """ 中间代码不满足不变式 """
+    pass
+
+
+def verify(cfg, frame, ssa=False):
+    """ 校验一个函数的四元式，发现问题时抛出 IRError。
+
+    检查的内容：
+        操作符合法；标号只定义一次，跳转目标都有定义并且与 CFG 的边一致；
+        label 只在块首，跳转和 return 只在块尾，phi 只在 SSA 形式中出现在块首；
+        引用的变量都属于 frame；
+        函数返回值在 %eax 被覆盖之前使用；
+        非 SSA 形式中，临时变量的每次使用都有定值可以到达；
+        SSA 形式中，每个变量至多定值一次，定值支配所有使用。
+    """
+    def fail(message, code=None):
+        if code is not None:
+            message = '{} {}'.format(message, code)
+        raise IRError('{}: {}'.format(cfg.name, message))
+
+    labels = {}
+    for block in cfg.blocks:
+        label = block.label
+        if label is not None:
+            if not isinstance(label, int):
+                fail('标号不是整数', block.codes[0])
+            if label in labels:
+                fail('标号重复定义', block.codes[0])
+            labels[label] = block
+
+    symbols = set(frame.symbols) | set(frame.params)
+    for block in cfg.blocks:
+        codes = block.codes
+        eax = None  # %eax 中是哪个函数的返回值
+        in_phis = True
+        for i, code in enumerate(codes):
+            op = code.op
+            if op not in KNOWN_OPS:
+                fail('未知的操作符', code)
+            if op == 'label' and i != 0:
+                fail('label 不在块首', code)
+            if (is_jump(code) or op == 'return') and i != len(codes) - 1:
+                fail('跳转不在块尾', code)
+            if is_jump(code):
+                if code.result not in labels:
+                    fail('跳转到未定义的标号', code)
+                if labels[code.result] not in block.succs:
+                    fail('修改跳转之后没有调用 CFG.link()', code)
+            if op == 'phi':
+                if not ssa:
+                    fail('非 SSA 形式中出现 phi', code)
+                if not in_phis:
+                    fail('phi 不在块首', code)
+                if set(code.arg1) != set(block.preds):
+                    fail('phi 的操作数与前驱块不一致', code)
+            elif op != 'label':
+                in_phis = False
+
+            operands = code.arg1.values() if op == 'phi' else \
+                [getattr(code, field) for field in code.use_fields()]
+            dest = code.dest()
+            for value in list(operands) + [dest]:
+                if value is None or isinstance(value, (int, str)):
+                    continue
+                if value.kind in ('local', 'temp', 'param') and value not in symbols:
+                    fail('变量 {} 不属于栈帧'.format(value), code)
+                if value.kind == 'call' and value is not dest and eax != value.func:
+                    fail('函数返回值已被覆盖', code)
+
+            if op == 'call':
+                eax = code.result
+            elif not (op == 'param' and code.arg2.kind in ('imm', 'str')):
+                eax = None
+
+    if ssa:
+        _verify_ssa(cfg, fail)
+    else:
+        _verify_temps(cfg, fail)
+
+
+def _verify_temps(cfg, fail):
+    reaching = ReachingDefinitions(cfg)
+    for block in cfg.reverse_postorder():
+        for code, reach in reaching.walk_forward(block):
+            for sym in code.uses():
+                if isinstance(sym, Temp) and not reach & reaching.defs_of.get(sym, 0):
+                    fail('临时变量 {} 使用前没有定值'.format(sym), code)
+
+
+def _verify_ssa(cfg, fail):
+    # 不可达的块没有重命名，不参与检查
+    reachable = cfg.reverse_postorder()
+    defs = {}  # {变量: (基本块, 序号)}
+    for block in reachable:
+        for i, code in enumerate(block.codes):
+            dest = code.dest()
+            if dest is not None and dest.kind != 'param':  # 形参仍是内存变量
+                if dest in defs:
+                    fail('SSA 变量 {} 多次定值'.format(dest), code)
+                defs[dest] = (block, i)
+
+    def dominated(sym, block, i):
+        if sym.kind == 'param':
+            return True
+        if sym not in defs:
+            return not isinstance(sym, Temp)  # 未初始化的局部变量
+        def_block, def_i = defs[sym]
+        if def_block is block:
+            return def_i < i
+        return cfg.dominates(def_block, block)
+
+    reached = set(reachable)
+    for block in reachable:
+        for i, code in enumerate(block.codes):
+            if code.op == 'phi':
+                for pred, value in code.arg1.items():
+                    if pred in reached and value in code.uses():
+                        if not dominated(value, pred, len(pred.codes)):
+                            fail('phi 的操作数 {} 的定值不支配前驱 {}'.format(value, pred), code)
+                continue
+            for sym in code.uses():
+                if not dominated(sym, block, i):
+                    fail('{} 的定值不支配使用'.format(sym), code)
@@ -0,0 +1,204 @@
+# ------------------------------------------------
+# bwcc: tests/test_char.py
+#
+# char 变量在各优化级别下的输出应与 -O0 相同：按字节存放的 char 在存入时截断，
+# 各遍优化传播常量和拷贝时不能越过截断
+#
+# 用法：python -m unittest tests.test_char
+# ------------------------------------------------
+import unittest
+
+from c_parser import CParser
+from c_passmgr import PassManager
+from c_translator import CTranslator
+
+CASES = {
+    'multiply': '''
+int main() {
+    char c = 44;
+    c = c * 8;
+    printf("%d\\n", c);
+    return 0;
+}
+''',
+    'narrowing copy': '''
+int main() {
+    int k = 300;
+    int j = 200;
+    char d = k;
+    char e = j + 100;
+    int x = d + 1;
+    int y = k + 1;
+    int z = e * 2;
+    int w = (j + 100) * 2;
+    printf("%d %d %d %d %d\\n", x, y, z, w, d);
+    return 0;
+}
+''',
+    'parameter': '''
+int h(int k) {
+    char d = k;
+    int x = d + 1;
+    int y = k + 1;
+    char e = k * 2;
+    int z = e * 3;
+    int w = k * 2 * 3;
+    printf("%d %d %d %d\\n", x, y, z, w);
+    return d;
+}
+int main() {
+    printf("%d\\n", h(300));
+    return 0;
+}
+''',
+    'branch': '''
+int main() {
+    char c = 44;
+    int i = 0;
+    int k = 300;
+    char d = k;
+    if (i < 1)
+        c = c * 8;
+    printf("%d %d\\n", c, d);
+    return 0;
+}
+''',
+    'loop': '''
+int g(char x) {
+    return x * 3;
+}
+int main() {
+    char c = 100;
+    int i;
+    for (i = 0; i < 5; i++) {
+        c = c + 50;
+        while (c > 120) c = c - 7;
+    }
+    printf("%d %d\\n", c, g(c + 200));
+    return 0;
+}
+''',
+}
+
+
+def _word(value):
+    value &= 0xffffffff
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def _byte(value):
+    value &= 0xff
+    return value - 0x100 if value & 0x80 else value
+
+
+def _divide(a, b):
+    q = abs(a) // abs(b)
+    return -q if (a < 0) != (b < 0) else q
+
+
+OPS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': _divide,
+    '%': lambda a, b: a - b * _divide(a, b),
+    '>': lambda a, b: int(a > b),
+    '<': lambda a, b: int(a < b),
+    '==': lambda a, b: int(a == b),
+    '>=': lambda a, b: int(a >= b),
+    '<=': lambda a, b: int(a <= b),
+    '!=': lambda a, b: int(a != b),
+}
+
+
+class Interpreter(object):
+    """ 直接执行优化后的四元式，按 CAssembler 的做法存放变量：char 局部变量和
+    临时变量存入时只保留低 8 位（movb），读出时符号扩展（movsbl），形参按字传递。
+    """
+
+    def __init__(self, codes, tables):
+        self.strings = {index: s for s, (_, index) in tables['constant_table'].items()}
+        self.frames = tables['symbol_table']
+        self.functions = {}
+        for code in codes:
+            if code.op == 'func':
+                body = self.functions[code.result] = []
+            elif code.op != 'endfunc':
+                body.append(code)
+        self.output = []
+
+    def call(self, name, args):
+        if name == 'printf':
+            fmt = self.strings[args[0]].encode().decode('unicode_escape')
+            self.output.append(fmt % tuple(args[1:]))
+            return len(self.output[-1])
+        body = self.functions[name]
+        labels = {code.result: i for i, code in enumerate(body) if code.op == 'label'}
+        env = dict(zip(self.frames[name].params, args))
+        results = {}
+        params = {}
+        pc = 0
+
+        def read(value):
+            if value.kind == 'imm':
+                return value.value
+            if value.kind == 'str':
+                return value.index
+            if value.kind == 'call':
+                return results[value.func]
+            return env[value]
+
+        while pc < len(body):
+            code = body[pc]
+            pc += 1
+            op = code.op
+            if op == 'label':
+                continue
+            if op == 'j':
+                pc = labels[code.result]
+            elif op[0] == 'j':
+                if OPS[op[1:]](read(code.arg1), read(code.arg2)):
+                    pc = labels[code.result]
+            elif op == 'param':
+                params[code.result - 1 - code.arg1] = read(code.arg2)
+            elif op == 'call':
+                results[code.result] = self.call(code.result, [params[i] for i in range(len(params))])
+                params = {}
+            elif op == 'return':
+                return read(code.result) if code.result is not None else 0
+            else:
+                if op == '=':
+                    value = read(code.arg1)
+                else:
+                    value = _word(OPS[op](read(code.arg1), read(code.arg2)))
+                dest = code.result
+                if dest.kind in ('local', 'temp') and dest.type == 'char':
+                    value = _byte(value)
+                env[dest] = value
+        return 0
+
+
+def run(source, level):
+    translator = CTranslator()
+    translator.visit(CParser().parse(source))
+    codes = list(PassManager(level, verify=True).run(translator.get_codes(), translator.symbol_table))
+    interpreter = Interpreter(codes, translator.get_tables(codes))
+    interpreter.call('main', [])
+    return ''.join(interpreter.output)
+
+
+class CharTest(unittest.TestCase):
+
+    def test_levels_agree(self):
+        for name, source in sorted(CASES.items()):
+            expected = run(source, 0)
+            for level in (1, 2):
+                self.assertEqual(run(source, level), expected, '{} at -O{}'.format(name, level))
+
+    def test_store_truncates(self):
+        for level in (0, 1, 2):
+            self.assertEqual(run(CASES['multiply'], level), '96\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,6 +31,19 @@ class Coord(object):
         return str
 
 
+def constant_value(node):
+    """ 返回整数或字符常量结点 c_ast.Constant 的值
+    """
+    if node.type == 'char':
+        return ord(node.value[1])
+    text = node.value.rstrip('uUlL')
+    if text[:2] in ('0x', '0X'):
+        return int(text, 16)
+    if len(text) > 1 and text[0] == '0':
+        return int(text, 8)
+    return int(text)
+
+
 class BaseParser(object):
     """ 作为PLY语法分析器的基础类，提供和语言无关的一些基本功能
     """